@@ -9,11 +9,9 @@ User = get_user_model()
 
 
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author', 'favorite_count')
+    list_display = ('name', 'author', 'pub_date', 'favorites_count')
     list_filter = ('author', 'name', 'tags')
-
-    def favorite_count(self, obj):
-        return obj.favorites.count()
+    list_select_related = ('author',)
 
 
 class IngredientAdmin(admin.ModelAdmin):
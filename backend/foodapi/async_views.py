@@ -0,0 +1,88 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections, connections
+
+from .middleware import install_query_profiler
+
+
+def run_view(view, request, *args, **kwargs):
+    close_old_connections()
+    for connection in connections.all():
+        install_query_profiler(connection)
+    try:
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    """Оборачивает синхронное представление в async для ASGI.
+
+    В ASGI Django выполняет синхронные представления в одном общем
+    потоке, и запросы воркера идут строго по очереди. Здесь представление
+    и рендеринг ответа выполняются в пуле потоков, каждый со своим
+    соединением с БД, а цикл событий воркера свободен для других запросов.
+    """
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await sync_to_async(run_view, thread_sensitive=False)(
+            view, request, *args, **kwargs
+        )
+
+    return wrapper
+
+
+class AsyncViewSetMixin:
+    """Отдаёт действия из async_actions через async_view в режиме ASGI.
+
+    Действия с потоковым ответом сюда не добавляются: их содержимое
+    читает StreamingASGIHandler уже после выхода из представления.
+    """
+    async_actions = ()
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if settings.ASYNC_VIEWS and set(actions.values()) & set(
+                cls.async_actions):
+            return async_view(view)
+        return view
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """ASGIHandler, читающий потоковые ответы вне цикла событий.
+
+    Django 4.0 перебирает потоковый ответ прямо в цикле событий, и
+    генератор, читающий из БД, падает с SynchronousOnlyOperation. Здесь
+    части ответа читаются по одной в потоке синхронных представлений
+    и сразу отправляются клиенту, ответ целиком в памяти не собирается.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        parts = iter(response)
+        response.streaming_content = ()
+        read = sync_to_async(next, thread_sensitive=True)
+        finished = object()
+
+        async def send_parts(message):
+            if message['type'] == 'http.response.body' and not message.get(
+                    'more_body'):
+                while (part := await read(parts, finished)) is not finished:
+                    for chunk, _ in self.chunk_bytes(part):
+                        await send({
+                            'type': 'http.response.body',
+                            'body': chunk,
+                            'more_body': True,
+                        })
+            await send(message)
+
+        return await super().send_response(response, send_parts)
@@ -0,0 +1,337 @@
+import copy
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .metrics import metrics
+from .models import Recipe, Tag
+from .routers import use_primary
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш в памяти процесса."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class CatalogCache:
+    """Версионируемый кэш справочника: память процесса и кэш Django.
+
+    Версия справочника хранится в кэше Django и меняется при любом
+    изменении справочника, поэтому записи старых версий больше не читаются
+    ни одним процессом.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.local = LRUCache(settings.CATALOG_CACHE_SIZE)
+
+    @property
+    def version_key(self):
+        return f'catalog:{self.name}:version'
+
+    def version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, time.time(), None)
+            version = cache.get(self.version_key, time.time())
+        return version
+
+    def invalidate(self):
+        """Меняет версию после фиксации транзакции, как ResponseCache.bump.
+
+        Иначе параллельный запрос успел бы сохранить под новой версией
+        ещё не изменённые строки.
+        """
+        transaction.on_commit(
+            lambda: cache.set(self.version_key, time.time(), None))
+
+    def get_or_build(self, key, build):
+        version = self.version()
+        digest = hashlib.md5(key.encode()).hexdigest()
+        cache_key = f'catalog:{self.name}:{version}:{digest}'
+        value = self.local.get(cache_key)
+        if value is not None:
+            self.record('local_hit')
+            return value
+        value = cache.get(cache_key)
+        if value is None:
+            self.record('miss')
+            with use_primary():
+                value = build()
+            cache.set(cache_key, value, settings.CATALOG_CACHE_TIMEOUT)
+        else:
+            self.record('hit')
+        self.local.set(cache_key, value)
+        return value
+
+    def record(self, result):
+        metrics.inc('foodgram_catalog_cache_requests_total',
+                    catalog=self.name, result=result)
+
+
+ingredients_catalog = CatalogCache('ingredients')
+tags_catalog = CatalogCache('tags')
+
+
+def tag_ids_by_slug():
+    return tags_catalog.get_or_build(
+        'slugs', lambda: dict(Tag.objects.values_list('slug', 'id'))
+    )
+
+
+class ResponseCache:
+    """Кэш ответов с инвалидацией по поколениям зависимостей.
+
+    Запись хранит поколения всех своих зависимостей (рецептов, авторов,
+    тегов) на момент сохранения и считается устаревшей, если хотя бы
+    одно из них сменилось. Поколение меняется после фиксации транзакции,
+    поэтому кэш не заполняется незафиксированными данными.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def generation_key(self, dependency):
+        return f'responses:{self.name}:generation:{dependency}'
+
+    def generations(self, dependencies):
+        keys = {self.generation_key(item): item for item in dependencies}
+        found = cache.get_many(keys)
+        missing = keys.keys() - found.keys()
+        if missing:
+            for key in missing:
+                cache.add(key, uuid.uuid4().hex, None)
+            found.update(cache.get_many(missing))
+        return {keys[key]: value for key, value in found.items()}
+
+    def bump(self, *dependencies):
+        transaction.on_commit(lambda: cache.set_many({
+            self.generation_key(item): uuid.uuid4().hex
+            for item in dependencies
+        }, None))
+
+    def invalidate(self):
+        self.bump('all')
+
+    def entry_key(self, key):
+        digest = hashlib.md5(key.encode()).hexdigest()
+        return f'responses:{self.name}:{digest}'
+
+    def get(self, key):
+        entry = cache.get(self.entry_key(key))
+        if entry is None:
+            return None
+        dependencies = entry['dependencies']
+        if self.generations(dependencies) != dependencies:
+            return None
+        return entry
+
+    def set(self, key, data, generations):
+        entry = {
+            'data': data,
+            'dependencies': generations,
+            'etag': hashlib.md5(json.dumps(
+                data, sort_keys=True, default=str
+            ).encode()).hexdigest(),
+        }
+        cache.set(self.entry_key(key), entry, settings.RECIPE_CACHE_TIMEOUT)
+        return entry
+
+
+recipe_responses = ResponseCache('recipes')
+
+
+def recipe_items(data):
+    if isinstance(data, dict) and 'results' in data:
+        return data['results']
+    if isinstance(data, dict):
+        return [data]
+    return data
+
+
+def apply_user_flags(data, flags):
+    """Проставляет рецептам флаги пользователя: {id: (fav, cart, sub)}."""
+    for item in recipe_items(data):
+        favorited, in_cart, subscribed = flags.get(
+            item['id'], (False, False, False))
+        item['is_favorited'] = favorited
+        item['is_in_shopping_cart'] = in_cart
+        item['author']['is_subscribed'] = subscribed
+    return data
+
+
+class RecipeCacheMixin:
+    """Кэширует list и retrieve рецептов в анонимном виде.
+
+    Кэшируются только запросы с параметрами из cached_params. Сортировки
+    в нём нет: счётчики избранного и время готовки меняются без сброса
+    зависимостей списков, и закэшированный порядок устаревал бы.
+    Авторизованный пользователь получает тот же ответ с наложенными
+    флагами избранного, корзины и подписки.
+    """
+    cached_params = {'page', 'limit', 'tags', 'tags_mode', 'author'}
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cache_key(self, request, kwargs):
+        params = request.query_params
+        if set(params) - self.cached_params:
+            return None
+        normalized = sorted(
+            (name, sorted({value for value in params.getlist(name)}))
+            for name in params
+        )
+        return (
+            f'{self.action}:{request.get_host()}:{sorted(kwargs.items())}:'
+            f'{normalized}:{ingredients_catalog.version()!r}:'
+            f'{tags_catalog.version()!r}'
+        )
+
+    def filter_dependencies(self, request, kwargs):
+        if self.action == 'retrieve':
+            return ['all']
+        params = request.query_params
+        dependencies = ['all']
+        dependencies.extend(
+            f'author:{author}' for author in params.getlist('author'))
+        slugs = tag_ids_by_slug()
+        dependencies.extend(
+            f'tag:{slugs[slug]}' for slug in params.getlist('tags')
+            if slug in slugs
+        )
+        if len(dependencies) == 1:
+            dependencies.append('recipes')
+        return dependencies
+
+    def user_flags(self, user, entry, response):
+        if response is not None:
+            return {
+                item['id']: (item['is_favorited'],
+                             item['is_in_shopping_cart'],
+                             item['author']['is_subscribed'])
+                for item in recipe_items(response.data)
+            }
+        ids = [item['id'] for item in recipe_items(entry['data'])]
+        return {
+            pk: tuple(values) for pk, *values in
+            Recipe.objects.filter(pk__in=ids).with_user_flags(
+                user
+            ).values_list('pk', 'is_favorited', 'is_in_shopping_cart',
+                          'author_is_subscribed')
+        }
+
+    def cached_response(self, view, request, *args, **kwargs):
+        if not settings.RECIPE_CACHE_ENABLED:
+            return view(request, *args, **kwargs)
+        key = self.cache_key(request, kwargs)
+        if key is None:
+            return view(request, *args, **kwargs)
+        response = None
+        entry = recipe_responses.get(key)
+        if entry is None:
+            generations = recipe_responses.generations(
+                self.filter_dependencies(request, kwargs))
+            with use_primary():
+                response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            data = apply_user_flags(copy.deepcopy(response.data), {})
+            dependencies = set()
+            for item in recipe_items(data):
+                dependencies.add(f'recipe:{item["id"]}')
+                dependencies.add(f'author:{item["author"]["id"]}')
+                dependencies.update(f'tag:{tag["id"]}' for tag in item['tags'])
+            generations.update(recipe_responses.generations(dependencies))
+            entry = recipe_responses.set(key, data, generations)
+        etag = entry['etag']
+        flags = {}
+        if not request.user.is_anonymous:
+            flags = self.user_flags(request.user, entry, response)
+            etag += '-' + hashlib.md5(
+                repr(sorted(flags.items())).encode()).hexdigest()
+        etag = f'"{etag}"'
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        if response is None:
+            data = copy.deepcopy(entry['data'])
+            response = Response(apply_user_flags(data, flags))
+            response['X-Cache'] = 'HIT'
+        else:
+            response['X-Cache'] = 'MISS'
+        response['ETag'] = etag
+        patch_vary_headers(response, ['Authorization'])
+        patch_cache_control(response, no_cache=True)
+        return response
+
+
+class CatalogCacheMixin:
+    """Отдаёт list и retrieve справочника из кэша с ETag/Last-Modified."""
+    catalog = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, view, request, *args, **kwargs):
+        version = self.catalog.version()
+        etag = f'"{self.catalog.name}-{version!r}"'
+        last_modified = int(version)
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if not_modified is not None:
+            return not_modified
+        params = sorted(request.query_params.lists())
+        key = f'{self.action}:{sorted(kwargs.items())}:{params}'
+        data = self.catalog.get_or_build(
+            key, lambda: view(request, *args, **kwargs).data
+        )
+        response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, no_cache=True)
+        return response
@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.dispatch import receiver
+
+
+@receiver(request_started)
+def check_connections(**kwargs):
+    """Закрывает мёртвые постоянные соединения перед запросом.
+
+    При CONN_MAX_AGE > 0 соединение переживает запрос и может быть
+    разорвано сервером БД или pgbouncer. Проверка выполняется не чаще
+    раза в DB_HEALTH_CHECK_INTERVAL секунд на соединение, чтобы
+    не добавлять лишний запрос к каждому HTTP-запросу.
+    """
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        checked = getattr(connection, 'health_checked_at', 0)
+        if now - checked < settings.DB_HEALTH_CHECK_INTERVAL:
+            continue
+        connection.health_checked_at = now
+        if not connection.is_usable():
+            connection.close()
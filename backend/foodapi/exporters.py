@@ -0,0 +1,74 @@
+import csv
+import json
+
+from django.db.models import Sum
+
+from .models import CartIngredient
+
+CHUNK_SIZE = 500
+
+
+def shopping_list_rows(user):
+    """Суммарное количество ингредиентов из корзины пользователя."""
+    return CartIngredient.objects.filter(
+        user=user
+    ).values_list(
+        'ingredient__name', 'ingredient__measurement_unit'
+    ).annotate(
+        total=Sum('amount')
+    ).order_by(
+        'ingredient__name', 'ingredient__measurement_unit'
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def batched(lines, size=CHUNK_SIZE):
+    """Склеивает строки в блоки, чтобы не отдавать ответ по строчке."""
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+class Echo:
+    """Псевдобуфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def export_txt(user, rows):
+    yield f'Список покупок пользователя {user.username}:\n'
+    for name, measurement_unit, amount in rows:
+        yield f'{name} ({measurement_unit}) - {amount}\n'
+
+
+def export_csv(user, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def export_json(user, rows):
+    separator = ''
+    yield '['
+    for name, measurement_unit, amount in rows:
+        item = json.dumps({
+            'name': name,
+            'measurement_unit': measurement_unit,
+            'amount': amount,
+        }, ensure_ascii=False)
+        yield f'{separator}{item}'
+        separator = ', '
+    yield ']\n'
+
+
+EXPORT_FORMATS = {
+    'txt': ('text/plain; charset=utf-8', export_txt),
+    'csv': ('text/csv; charset=utf-8', export_csv),
+    'json': ('application/json; charset=utf-8', export_json),
+}
@@ -1,25 +1,42 @@
 import django_filters
 from django.contrib.auth import get_user_model
+from django.db.models import Count
 
+from .cache import tag_ids_by_slug
 from .models import Recipe, Ingredient
+from .search import autocomplete_ingredients, search_recipes
 
 User = get_user_model()
 
 
 class IngredientFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(
-        field_name='name',
-        lookup_expr='istartswith'
+        method='get_name'
     )
 
+    def get_name(self, queryset, name, value):
+        return autocomplete_ingredients(queryset, value)
+
     class Meta:
         model = Ingredient
         fields = ('name', 'measurement_unit')
 
 
+class RecipeOrderingFilter(django_filters.OrderingFilter):
+    """Сортировка с id последним ключом, чтобы порядок был однозначным."""
+
+    def filter(self, qs, value):
+        qs = super().filter(qs, value)
+        ordering = qs.query.order_by
+        if not ordering:
+            return qs
+        tiebreak = '-id' if ordering[-1].startswith('-') else 'id'
+        return qs.order_by(*ordering, tiebreak)
+
+
 class RecipeFilter(django_filters.FilterSet):
-    tags = django_filters.AllValuesMultipleFilter(
-        field_name='tags__slug'
+    tags = django_filters.CharFilter(
+        method='get_tags'
     )
     author = django_filters.ModelChoiceFilter(
         queryset=User.objects.all()
@@ -30,6 +47,32 @@ class RecipeFilter(django_filters.FilterSet):
     is_in_shopping_cart = django_filters.NumberFilter(
         method='get_is_in_shopping_cart'
     )
+    search = django_filters.CharFilter(
+        method='get_search'
+    )
+    ordering = RecipeOrderingFilter(
+        fields=(
+            ('pub_date', 'created'),
+            ('favorites_count', 'favorites'),
+            ('cooking_time', 'cooking_time'),
+        )
+    )
+
+    def get_tags(self, queryset, name, value):
+        """Рецепты с любым из тегов или, при tags_mode=all, со всеми."""
+        slugs = set(self.data.getlist('tags'))
+        tag_ids = [
+            tag_id for slug, tag_id in tag_ids_by_slug().items()
+            if slug in slugs
+        ]
+        recipe_tags = Recipe.tags.through.objects.filter(tag_id__in=tag_ids)
+        if self.data.get('tags_mode') == 'all':
+            if len(tag_ids) < len(slugs):
+                return queryset.none()
+            recipe_tags = recipe_tags.values('recipe_id').annotate(
+                tags_count=Count('tag_id')
+            ).filter(tags_count=len(tag_ids))
+        return queryset.filter(pk__in=recipe_tags.values('recipe_id'))
 
     def get_is_favorited(self, queryset, name, value):
         user = self.request.user
@@ -43,6 +86,12 @@ class RecipeFilter(django_filters.FilterSet):
             return queryset.filter(carts__user=user)
         return queryset
 
+    def get_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = (
+            'tags', 'author', 'is_favorited', 'is_in_shopping_cart', 'search',
+            'ordering',
+        )
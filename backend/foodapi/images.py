@@ -0,0 +1,163 @@
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+from rest_framework.exceptions import ValidationError
+
+from .cache import recipe_responses
+from .metrics import metrics
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+UPLOAD_FORMATS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'WEBP': 'webp',
+    'GIF': 'gif',
+}
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку на диск блоками и обрывает её при превышении размера."""
+    chunk_size = 64 * 2 ** 10
+
+    def new_file(self, *args, **kwargs):
+        self.received = 0
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.file.close()
+            raise ValidationError({'image': (
+                'Размер картинки не должен превышать '
+                f'{settings.RECIPE_IMAGE_MAX_SIZE} байт!'
+            )})
+        return super().receive_data_chunk(raw_data, start)
+
+
+def store_uploaded_image(recipe, upload):
+    """Проверяет загруженную картинку по заголовку и сохраняет её."""
+    max_dimension = settings.RECIPE_IMAGE_MAX_DIMENSION
+    try:
+        with Image.open(upload) as image:
+            image_format = image.format
+            width, height = image.size
+            if max(width, height) > max_dimension:
+                raise ValidationError({'image': (
+                    'Стороны картинки не должны превышать '
+                    f'{max_dimension} пикселей!'
+                )})
+            image.verify()
+    except ValidationError:
+        raise
+    except Exception:
+        raise ValidationError({'image': 'Загрузите корректную картинку!'})
+    if image_format not in UPLOAD_FORMATS:
+        raise ValidationError({'image': 'Неподдерживаемый формат картинки!'})
+    upload.seek(0)
+    try:
+        recipe.image.save(
+            f'{uuid.uuid4()}.{UPLOAD_FORMATS[image_format]}', upload
+        )
+    finally:
+        upload.close()
+    schedule_variants(recipe.pk)
+
+
+class ImageQueue:
+    """Пул потоков для фоновой нарезки превью картинок рецептов."""
+
+    def __init__(self):
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def depth(self):
+        return self._pending
+
+    def get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.IMAGE_WORKERS,
+                    thread_name_prefix='recipe-images',
+                )
+            return self._executor
+
+    def submit(self, recipe_id):
+        if settings.IMAGE_PROCESSING_SYNC:
+            generate_variants(recipe_id)
+            return
+        with self._lock:
+            self._pending += 1
+        self.get_executor().submit(self.run, recipe_id)
+
+    def run(self, recipe_id):
+        try:
+            generate_variants(recipe_id)
+        except Exception:
+            logger.exception('Не удалось нарезать превью рецепта %s',
+                             recipe_id)
+        finally:
+            connections.close_all()
+            with self._lock:
+                self._pending -= 1
+
+
+image_queue = ImageQueue()
+metrics.register_gauge('foodgram_image_queue_depth',
+                       lambda: image_queue.depth)
+
+
+def schedule_variants(recipe_id):
+    """Ставит нарезку превью в очередь после фиксации транзакции."""
+    transaction.on_commit(lambda: image_queue.submit(recipe_id))
+
+
+def generate_variants(recipe_id):
+    recipe = Recipe.objects.filter(pk=recipe_id).only(
+        'image', 'image_variants').first()
+    if recipe is None or not recipe.image:
+        return
+    original_name = recipe.image.name
+    base_name = os.path.splitext(os.path.basename(original_name))[0]
+    with recipe.image.open('rb') as image_file:
+        image = ImageOps.exif_transpose(Image.open(image_file))
+        image = image.convert('RGB')
+    variants = {}
+    for size_name, size in settings.RECIPE_IMAGE_VARIANTS.items():
+        thumbnail = image.copy()
+        thumbnail.thumbnail((size, size))
+        for variant_format, (pil_format, extension) in (
+                VARIANT_FORMATS.items()):
+            buffer = BytesIO()
+            thumbnail.save(buffer, pil_format,
+                           quality=settings.IMAGE_VARIANT_QUALITY)
+            variants[f'{size_name}_{variant_format}'] = default_storage.save(
+                f'images/variants/{base_name}_{size_name}.{extension}',
+                ContentFile(buffer.getvalue()),
+            )
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image=original_name
+    ).update(image_variants=variants)
+    if updated:
+        recipe_responses.bump(f'recipe:{recipe_id}')
+    stale = recipe.image_variants.values() if updated else variants.values()
+    for name in stale:
+        default_storage.delete(name)
@@ -0,0 +1,191 @@
+import json
+import platform
+import time
+from datetime import datetime, timezone
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from foodapi.models import Ingredient, Recipe, Tag
+
+from .seed_bench import BENCH_PREFIX
+
+User = get_user_model()
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    index = max(0, -(-len(ordered) * percent // 100) - 1)
+    return ordered[int(index)]
+
+
+def consume(response):
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+def hot_paths(anonymous, authorized):
+    """Горячие эндпоинты API: имя -> (клиент, url)."""
+    recipe = Recipe.objects.order_by('-pk').first()
+    tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+    ingredient = Ingredient.objects.order_by('pk').first()
+    if recipe is None or ingredient is None:
+        raise CommandError('Нет данных, сначала запустите seed_bench.')
+    ingredient_ids = ','.join(
+        str(pk) for pk in recipe.ingredients.values_list('pk', flat=True))
+    tag_query = '&'.join(f'tags={slug}' for slug in tags)
+    return {
+        'recipes_list_anonymous': (anonymous, '/api/recipes/'),
+        'recipes_list': (authorized, '/api/recipes/'),
+        'recipes_list_cursor': (
+            authorized, '/api/recipes/?pagination=cursor'),
+        'recipes_newest': (authorized, '/api/recipes/?ordering=-created'),
+        'recipes_popular': (
+            authorized, '/api/recipes/?ordering=-favorites'),
+        'recipes_quickest': (
+            authorized, '/api/recipes/?ordering=cooking_time'),
+        'recipes_popular_cursor': (
+            authorized,
+            '/api/recipes/?ordering=-favorites&pagination=cursor'),
+        'recipes_retrieve': (authorized, f'/api/recipes/{recipe.pk}/'),
+        'recipes_filter_tags': (
+            authorized, f'/api/recipes/?{tag_query}'),
+        'recipes_filter_author': (
+            authorized, f'/api/recipes/?author={recipe.author_id}'),
+        'recipes_filter_favorited': (
+            authorized, '/api/recipes/?is_favorited=1'),
+        'recipes_filter_cart': (
+            authorized, '/api/recipes/?is_in_shopping_cart=1'),
+        'recipes_search': (
+            authorized, f'/api/recipes/?search={recipe.name.split()[0]}'),
+        'recipes_cook': (
+            authorized,
+            f'/api/recipes/cook/?ingredients={ingredient_ids}'),
+        'subscriptions': (
+            authorized, '/api/users/subscriptions/?recipes_limit=3'),
+        'download_shopping_cart': (
+            authorized, '/api/recipes/download_shopping_cart/'),
+        'ingredients_search': (
+            anonymous,
+            f'/api/ingredients/?name={ingredient.name[:3]}'),
+    }
+
+
+def bench_user(username=None):
+    """Пользователь для замеров: указанный или первый bench_."""
+    users = User.objects.order_by('pk')
+    if username:
+        users = users.filter(username=username)
+    else:
+        users = users.filter(username__startswith=BENCH_PREFIX)
+    user = users.first()
+    if user is None:
+        raise CommandError(
+            'Пользователь не найден, сначала запустите seed_bench.')
+    return user
+
+
+class Command(BaseCommand):
+    """Замер задержек и числа SQL-запросов основных эндпоинтов API.
+
+    Запросы идут через тестовый клиент Django, без сетевого слоя.
+    Результаты пишутся в JSON; с --compare выводится разница
+    с предыдущим замером.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', default=50, type=int)
+        parser.add_argument('--warmup', default=3, type=int)
+        parser.add_argument('--output', default='bench.json')
+        parser.add_argument('--compare',
+                            help='JSON предыдущего замера для сравнения.')
+        parser.add_argument('--user',
+                            help='Username пользователя для запросов '
+                                 '(по умолчанию первый bench_).')
+        parser.add_argument('--only', nargs='+', default=(),
+                            help='Запустить только указанные сценарии.')
+
+    def handle(self, *args, **options):
+        user = bench_user(options['user'])
+        token, _ = Token.objects.get_or_create(user=user)
+        anonymous = Client()
+        authorized = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        scenarios = hot_paths(anonymous, authorized)
+        if options['only']:
+            scenarios = {
+                name: scenario for name, scenario in scenarios.items()
+                if name in options['only']
+            }
+        results = {}
+        for name, (client, url) in scenarios.items():
+            results[name] = self.measure(
+                client, url, options['iterations'], options['warmup'])
+            self.stdout.write(
+                f'{name:<28} p50 {results[name]["p50_ms"]:8.2f} мс  '
+                f'p95 {results[name]["p95_ms"]:8.2f} мс  '
+                f'p99 {results[name]["p99_ms"]:8.2f} мс  '
+                f'запросов {results[name]["queries"]}'
+            )
+        report = {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'vendor': connection.vendor,
+                'python': platform.python_version(),
+                'iterations': options['iterations'],
+                'user': user.username,
+                'recipes': Recipe.objects.count(),
+                'users': User.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты записаны в {options["output"]}')
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def measure(self, client, url, iterations, warmup):
+        for _ in range(warmup):
+            consume(client.get(url))
+        timings = []
+        queries = []
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = client.get(url)
+                consume(response)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(context.captured_queries))
+        if response.status_code != 200:
+            raise CommandError(
+                f'{url}: неожиданный статус {response.status_code}')
+        return {
+            'url': url,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'queries': max(queries),
+        }
+
+    def compare(self, path, results):
+        with open(path, 'r', encoding='utf-8') as previous_file:
+            previous = json.load(previous_file)['results']
+        for name, result in results.items():
+            if name not in previous:
+                continue
+            before = previous[name]
+            change = (result['p95_ms'] - before['p95_ms']) / max(
+                before['p95_ms'], 0.001) * 100
+            self.stdout.write(
+                f'{name:<28} p95 {before["p95_ms"]:8.2f} -> '
+                f'{result["p95_ms"]:8.2f} мс ({change:+.1f}%)  '
+                f'запросов {before["queries"]} -> {result["queries"]}'
+            )
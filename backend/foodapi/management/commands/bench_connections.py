@@ -0,0 +1,90 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.db.backends.signals import connection_created
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from .bench_api import bench_user, consume, percentile
+
+DEFAULT_PATHS = ('/api/tags/', '/api/ingredients/?name=а')
+
+
+class Command(BaseCommand):
+    """Замер накладных расходов на открытие соединения с БД.
+
+    Сравнивает время ответа дешёвых эндпоинтов при CONN_MAX_AGE=0
+    и при постоянных соединениях. Между запросами соединения
+    закрываются так же, как по сигналам request_started/finished.
+    Запросы идут с токеном, так как справочники отдаются из кэша
+    и без авторизации могут вовсе не обращаться к БД.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', default=200, type=int)
+        parser.add_argument('--max-age', default=600, type=int,
+                            help='CONN_MAX_AGE для постоянных соединений.')
+        parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS)
+        parser.add_argument('--user',
+                            help='Username для авторизованных запросов '
+                                 '(по умолчанию первый bench_).')
+
+    def handle(self, *args, **options):
+        connect = self.measure_connect(options['iterations'])
+        self.stdout.write(
+            f'Открытие соединения ({connection.vendor}): '
+            f'p50 {percentile(connect, 50):.2f} мс, '
+            f'p99 {percentile(connect, 99):.2f} мс'
+        )
+        client = Client(HTTP_AUTHORIZATION=self.token(options['user']))
+        original = connection.settings_dict['CONN_MAX_AGE']
+        try:
+            for path in options['paths']:
+                for max_age in (0, options['max_age']):
+                    timings, connects = self.measure_requests(
+                        client, path, max_age, options['iterations'])
+                    self.stdout.write(
+                        f'{path:<28} CONN_MAX_AGE={max_age:<5} '
+                        f'p50 {percentile(timings, 50):7.2f} мс  '
+                        f'p95 {percentile(timings, 95):7.2f} мс  '
+                        f'соединений {connects}'
+                    )
+        finally:
+            connection.settings_dict['CONN_MAX_AGE'] = original
+            connection.close()
+
+    def token(self, username):
+        token, _ = Token.objects.get_or_create(user=bench_user(username))
+        return f'Token {token.key}'
+
+    def measure_connect(self, iterations):
+        timings = []
+        for _ in range(iterations):
+            connection.close()
+            started = time.perf_counter()
+            connection.ensure_connection()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def measure_requests(self, client, path, max_age, iterations):
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+        connection.close()
+        consume(client.get(path))
+        timings = []
+        connects = []
+
+        def connected(sender, **kwargs):
+            connects.append(sender)
+
+        connection_created.connect(connected)
+        try:
+            for _ in range(iterations):
+                close_old_connections()
+                started = time.perf_counter()
+                consume(client.get(path))
+                timings.append((time.perf_counter() - started) * 1000)
+                close_old_connections()
+        finally:
+            connection_created.disconnect(connected)
+        return timings, len(connects)
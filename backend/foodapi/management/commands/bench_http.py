@@ -0,0 +1,164 @@
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from .bench_api import bench_user, percentile
+
+DEFAULT_PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?limit=12&page=2',
+    '/api/ingredients/?name=бо',
+    '/api/recipes/download_shopping_cart/',
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.5).close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+class Command(BaseCommand):
+    """Нагрузочное сравнение режимов WSGI и ASGI по HTTP.
+
+    Для каждого режима запускает gunicorn с gunicorn.conf.py и одинаковым
+    числом воркеров и гоняет запросы из --concurrency потоков. Каждый
+    запрос идёт в новом соединении, как из nginx без keepalive.
+    С --url нагружает уже запущенный сервер.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', default=['wsgi', 'asgi'],
+                            choices=['wsgi', 'asgi'])
+        parser.add_argument('--workers', default=2, type=int)
+        parser.add_argument('--concurrency', default=16, type=int)
+        parser.add_argument('--duration', default=10, type=float,
+                            help='Секунд нагрузки на каждый путь.')
+        parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS)
+        parser.add_argument('--url',
+                            help='Адрес запущенного сервера вместо gunicorn.')
+        parser.add_argument('--user',
+                            help='Username для авторизованных запросов '
+                                 '(по умолчанию первый bench_).')
+        parser.add_argument('--output', default='bench_http.json')
+
+    def handle(self, *args, **options):
+        headers = self.auth_headers(options['user'])
+        report = {
+            'meta': {
+                'workers': options['workers'],
+                'concurrency': options['concurrency'],
+                'duration': options['duration'],
+            },
+            'results': {},
+        }
+        targets = [('external', options['url'])] if options['url'] else [
+            (mode, None) for mode in options['modes']
+        ]
+        for mode, url in targets:
+            server = None
+            if url is None:
+                server, url = self.start_server(mode, options['workers'])
+            try:
+                report['results'][mode] = {
+                    path: self.load(url, path, headers, options)
+                    for path in options['paths']
+                }
+            finally:
+                if server is not None:
+                    server.terminate()
+                    server.wait(30)
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты записаны в {options["output"]}')
+
+    def auth_headers(self, username):
+        token, _ = Token.objects.get_or_create(user=bench_user(username))
+        return {'Authorization': f'Token {token.key}'}
+
+    def start_server(self, mode, workers):
+        port = free_port()
+        environment = dict(os.environ, SERVER_MODE=mode,
+                           GUNICORN_BIND=f'127.0.0.1:{port}')
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+             '--workers', str(workers), '--log-level', 'warning'],
+            cwd=settings.BASE_DIR, env=environment,
+        )
+        if not wait_for_port(port, 30):
+            server.terminate()
+            raise CommandError(f'Сервер {mode} не запустился.')
+        return server, f'http://127.0.0.1:{port}'
+
+    def load(self, url, path, headers, options):
+        address = urlsplit(url)
+        target = quote(path, safe='/?&=%')
+        timings = []
+        errors = []
+        deadline = time.monotonic() + options['duration']
+
+        def worker():
+            while time.monotonic() < deadline:
+                connection = http.client.HTTPConnection(
+                    address.hostname, address.port, timeout=30)
+                started = time.perf_counter()
+                try:
+                    connection.request('GET', target, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    if response.status != 200:
+                        errors.append(response.status)
+                        continue
+                    timings.append(time.perf_counter() - started)
+                except (OSError, http.client.HTTPException) as error:
+                    errors.append(str(error))
+                finally:
+                    connection.close()
+
+        threads = [
+            threading.Thread(target=worker)
+            for _ in range(options['concurrency'])
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+        if not timings:
+            raise CommandError(f'{url}{path}: нет успешных ответов {errors}')
+        result = {
+            'requests': len(timings),
+            'errors': len(errors),
+            'rps': round(len(timings) / elapsed, 1),
+            'p50_ms': round(percentile(timings, 50) * 1000, 2),
+            'p95_ms': round(percentile(timings, 95) * 1000, 2),
+            'p99_ms': round(percentile(timings, 99) * 1000, 2),
+        }
+        self.stdout.write(
+            f'{url} {path:<40} {result["rps"]:8.1f} rps  '
+            f'p50 {result["p50_ms"]:8.2f} мс  '
+            f'p99 {result["p99_ms"]:8.2f} мс  ошибок {result["errors"]}'
+        )
+        return result
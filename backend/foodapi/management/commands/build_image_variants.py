@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from foodapi.images import generate_variants
+from foodapi.models import Recipe
+
+
+class Command(BaseCommand):
+    """Нарезка превью для картинок рецептов, у которых их ещё нет."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Пересоздать превью у всех рецептов.')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        count = failed = 0
+        for recipe_id in recipes.values_list('pk', flat=True).iterator():
+            try:
+                generate_variants(recipe_id)
+            except Exception as error:
+                failed += 1
+                self.stderr.write(
+                    f'Рецепт {recipe_id}: не удалось нарезать превью: '
+                    f'{error!r}'
+                )
+                continue
+            count += 1
+        self.stdout.write(f'Превью созданы для рецептов: {count}')
+        if failed:
+            self.stdout.write(f'Пропущено из-за ошибок: {failed}')
@@ -0,0 +1,163 @@
+import json
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from foodapi.cache import ingredients_catalog, tags_catalog
+
+from .bench_api import bench_user, consume, hot_paths
+
+COUNT_WRAPPER = re.compile(r'SELECT COUNT\(\*\) FROM \((.*)\) subquery$', re.S)
+TABLE_ALIAS = re.compile(r'(?:FROM|JOIN) "(\w+)" (\w+)')
+
+
+def outer_clause(sql):
+    """Внешний уровень запроса без подзапросов в скобках.
+
+    У COUNT(*) по подзапросу внешним уровнем считается сам подзапрос.
+    """
+    match = COUNT_WRAPPER.match(sql)
+    if match:
+        sql = match.group(1)
+    depth, chars = 0, []
+    for char in sql:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif not depth:
+            chars.append(char)
+    return ''.join(chars)
+
+
+def sqlite_full_scans(cursor, sql):
+    """Полные обходы таблиц и индексов по EXPLAIN QUERY PLAN.
+
+    Внешний цикл запроса с LIMIT, идущий в порядке сортировки,
+    не считается: он останавливается на первых строках.
+    """
+    cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+    rows = cursor.fetchall()
+    aliases = {alias: table for table, alias in TABLE_ALIAS.findall(sql)}
+    outer = [
+        node for node, parent, _, detail in rows
+        if parent == 0 and detail.split()[0] in ('SCAN', 'SEARCH')
+    ]
+    ordered_walk = outer and ' LIMIT ' in outer_clause(sql) and not any(
+        'TEMP B-TREE FOR ORDER BY' in detail
+        for _, parent, _, detail in rows if parent == 0
+    )
+    for node, parent, _, detail in rows:
+        words = detail.split()
+        if words[0] != 'SCAN' or 'VIRTUAL' in words or words[1] == 'CONSTANT':
+            continue
+        if ordered_walk and node == outer[0]:
+            continue
+        yield aliases.get(words[1], words[1]), detail, parent == 0
+
+
+def postgresql_full_scans(cursor, sql):
+    cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    nodes = [(plan[0]['Plan'], False)]
+    while nodes:
+        node, nested = nodes.pop()
+        nested = nested or node.get('Parent Relationship') in (
+            'SubPlan', 'InitPlan')
+        nodes.extend((child, nested) for child in node.get('Plans', ()))
+        if node['Node Type'] == 'Seq Scan':
+            yield node['Relation Name'], node['Node Type'], not nested
+
+
+FULL_SCANS = {
+    'sqlite': sqlite_full_scans,
+    'postgresql': postgresql_full_scans,
+}
+
+
+class Command(BaseCommand):
+    """Проверка планов SQL-запросов горячих эндпоинтов через EXPLAIN.
+
+    Эндпоинты из bench_api прогоняются тестовым клиентом без кэша
+    ответов, для каждого SELECT строится план. Полное сканирование
+    таблицы больше --min-rows строк считается ошибкой. Запускать
+    на данных seed_bench, чтобы планировщик видел реальные объёмы.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-rows', default=1000, type=int,
+                            help='Таблицы меньше этого размера не '
+                                 'проверяются.')
+        parser.add_argument('--user',
+                            help='Username для авторизованных запросов '
+                                 '(по умолчанию первый bench_).')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in FULL_SCANS:
+            raise CommandError(
+                f'EXPLAIN для {connection.vendor} не поддерживается.')
+        full_scans = FULL_SCANS[connection.vendor]
+        token, _ = Token.objects.get_or_create(
+            user=bench_user(options['user']))
+        anonymous = Client()
+        authorized = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.sizes = {}
+        self.tables = set(connection.introspection.table_names())
+        violations = []
+        with override_settings(RECIPE_CACHE_ENABLED=False):
+            for name, (client, url) in hot_paths(
+                    anonymous, authorized).items():
+                ingredients_catalog.invalidate()
+                tags_catalog.invalidate()
+                with CaptureQueriesContext(connection) as context:
+                    response = client.get(url)
+                    consume(response)
+                if response.status_code != 200:
+                    raise CommandError(
+                        f'{url}: неожиданный статус {response.status_code}')
+                found = self.find_full_scans(
+                    context.captured_queries, full_scans, options['min_rows'])
+                violations.extend((name, *item) for item in found)
+                self.stdout.write(
+                    f'{name:<28} запросов {len(context.captured_queries):>3}'
+                    f'  полных сканирований {len(found)}'
+                )
+        for name, table, detail, sql in violations:
+            self.stdout.write(f'{name}: {table} ({detail})\n  {sql}')
+        if violations:
+            raise CommandError(
+                f'Полных сканирований крупных таблиц: {len(violations)}')
+        self.stdout.write('Все запросы используют индексы.')
+
+    def table_size(self, cursor, table):
+        if table not in self.sizes:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+            self.sizes[table] = cursor.fetchone()[0]
+        return self.sizes[table]
+
+    def find_full_scans(self, queries, full_scans, min_rows):
+        found = []
+        with connection.cursor() as cursor:
+            for sql in {query['sql'] for query in queries}:
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                outer = outer_clause(sql)
+                whole_table = ' WHERE ' not in outer and ' LIMIT ' not in outer
+                for table, detail, outer_level in full_scans(cursor, sql):
+                    # Производные таблицы подзапросов не проверяются.
+                    if table not in self.tables:
+                        continue
+                    # Чтение всей таблицы: справочник для индекса в памяти
+                    # или COUNT(*) без фильтров.
+                    if outer_level and whole_table:
+                        continue
+                    if self.table_size(cursor, table) >= min_rows:
+                        found.append((table, detail, sql))
+        return found
@@ -0,0 +1,58 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand
+
+from foodapi.models import Recipe
+
+
+def recipe_to_dict(recipe):
+    return {
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'pub_date': recipe.pub_date.isoformat(),
+        'image': recipe.image.name,
+        'author': recipe.author.username,
+        'tags': [tag.slug for tag in recipe.tags.all()],
+        'ingredients': [
+            {
+                'name': amount.ingredient.name,
+                'measurement_unit': amount.ingredient.measurement_unit,
+                'amount': amount.amount,
+            }
+            for amount in recipe.ingredientsamount_set.all()
+        ],
+    }
+
+
+class Command(BaseCommand):
+    """Выгрузка рецептов в NDJSON: один рецепт на строку."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', default='-',
+                            help='Файл для выгрузки, по умолчанию stdout.')
+        parser.add_argument('--batch-size', default=1000, type=int)
+
+    def handle(self, *args, **options):
+        if options['output'] == '-':
+            self.export(sys.stdout, options['batch_size'])
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                count = self.export(output, options['batch_size'])
+            self.stdout.write(f'Выгружено рецептов: {count}')
+
+    def export(self, output, batch_size):
+        count = 0
+        last_id = 0
+        while True:
+            batch = list(Recipe.objects.with_related().filter(
+                pk__gt=last_id).order_by('pk')[:batch_size])
+            if not batch:
+                return count
+            output.writelines(
+                json.dumps(recipe_to_dict(recipe), ensure_ascii=False) + '\n'
+                for recipe in batch
+            )
+            count += len(batch)
+            last_id = batch[-1].pk
@@ -0,0 +1,165 @@
+import json
+import time
+from collections import Counter
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from foodapi.cache import ingredients_catalog, recipe_responses
+from foodapi.models import (Ingredient, IngredientsAmount, Recipe, Tag,
+                            UserStats)
+from foodapi.search import update_recipe_search
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """Загрузка рецептов из NDJSON, выгруженного export_recipes.
+
+    Авторы, теги и ингредиенты сопоставляются по естественным ключам
+    (username, slug, название и единица измерения), рецепты пишутся
+    пачками через bulk_create, каждая пачка - в своей транзакции.
+    Недостающие ингредиенты создаются, рецепты неизвестных авторов
+    пропускаются, если не задан --default-author. Дата публикации
+    сохраняется, если она есть в выгрузке.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Файл NDJSON с рецептами.')
+        parser.add_argument('--batch-size', default=1000, type=int)
+        parser.add_argument('--default-author',
+                            help='Username автора для неизвестных авторов.')
+
+    def handle(self, *args, **options):
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.ingredients = {
+            (name, unit): pk for pk, name, unit in
+            Ingredient.objects.values_list('pk', 'name', 'measurement_unit')
+        }
+        self.users = {}
+        self.default_author = None
+        if options['default_author']:
+            self.default_author = User.objects.filter(
+                username=options['default_author']
+            ).values_list('pk', flat=True).first()
+            if self.default_author is None:
+                raise CommandError('Автор по умолчанию не найден!')
+        self.skipped = 0
+        started = time.monotonic()
+        imported = 0
+        try:
+            with open(options['input'], 'r', encoding='utf-8') as f:
+                lines = (line for line in f if line.strip())
+                while True:
+                    batch = [
+                        json.loads(line)
+                        for line in islice(lines, options['batch_size'])
+                    ]
+                    if not batch:
+                        break
+                    imported += self.import_batch(batch)
+        except FileNotFoundError:
+            raise CommandError('Файл с рецептами не найден!')
+        recipe_responses.invalidate()
+        elapsed = time.monotonic() - started
+        rate = imported / elapsed if elapsed else imported
+        self.stdout.write(
+            f'Загружено рецептов: {imported}, пропущено: {self.skipped} '
+            f'за {elapsed:.2f} с ({rate:.0f} рецептов/с).'
+        )
+
+    def resolve_users(self, batch):
+        usernames = {
+            item['author'] for item in batch
+        } - self.users.keys()
+        if usernames:
+            self.users.update(User.objects.filter(
+                username__in=usernames).values_list('username', 'pk'))
+
+    def resolve_ingredients(self, batch):
+        missing = {
+            (item['name'], item['measurement_unit'])
+            for recipe in batch for item in recipe['ingredients']
+        } - self.ingredients.keys()
+        if not missing:
+            return
+        Ingredient.objects.bulk_create([
+            Ingredient(name=name, measurement_unit=unit)
+            for name, unit in missing
+        ], ignore_conflicts=True)
+        ingredients_catalog.invalidate()
+        for pk, name, unit in Ingredient.objects.filter(
+                name__in={name for name, _ in missing}).values_list(
+                'pk', 'name', 'measurement_unit'):
+            self.ingredients[(name, unit)] = pk
+
+    def valid(self, item, author_id):
+        return (
+            author_id is not None
+            and item['cooking_time'] >= 1
+            and item['ingredients']
+            and all(amount['amount'] >= 1 for amount in item['ingredients'])
+        )
+
+    def import_batch(self, batch):
+        self.resolve_users(batch)
+        self.resolve_ingredients(batch)
+        items = []
+        for item in batch:
+            author_id = self.users.get(item['author'], self.default_author)
+            if self.valid(item, author_id):
+                items.append((item, author_id))
+            else:
+                self.skipped += 1
+        with transaction.atomic():
+            recipes = Recipe.objects.bulk_create([
+                Recipe(
+                    author_id=author_id,
+                    name=item['name'],
+                    text=item['text'],
+                    cooking_time=item['cooking_time'],
+                    image=item['image'],
+                )
+                for item, author_id in items
+            ])
+            # auto_now_add перезаписывает дату при bulk_create.
+            dated = []
+            for recipe, (item, _) in zip(recipes, items):
+                if item.get('pub_date'):
+                    recipe.pub_date = parse_datetime(item['pub_date'])
+                    dated.append(recipe)
+            Recipe.objects.bulk_update(dated, ['pub_date'])
+            amounts = {}
+            recipe_tags = set()
+            for recipe, (item, _) in zip(recipes, items):
+                for ingredient in item['ingredients']:
+                    ingredient_id = self.ingredients[
+                        (ingredient['name'], ingredient['measurement_unit'])
+                    ]
+                    key = (recipe.pk, ingredient_id)
+                    amounts[key] = amounts.get(key, 0) + ingredient['amount']
+                recipe_tags.update(
+                    (recipe.pk, self.tags[slug])
+                    for slug in item['tags'] if slug in self.tags
+                )
+            IngredientsAmount.objects.bulk_create([
+                IngredientsAmount(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=amount,
+                )
+                for (recipe_id, ingredient_id), amount in amounts.items()
+            ])
+            Recipe.tags.through.objects.bulk_create([
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id, tag_id in recipe_tags
+            ])
+            for author_id, count in Counter(
+                    recipe.author_id for recipe in recipes).items():
+                UserStats.objects.increment(
+                    author_id, 'recipes_count', count)
+            update_recipe_search(recipe.pk for recipe in recipes)
+        return len(recipes)
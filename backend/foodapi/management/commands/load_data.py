@@ -1,44 +1,150 @@
+import csv
 import json
 import os
+import time
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from django.db.utils import IntegrityError
+from django.db import transaction
 
+from foodapi.cache import ingredients_catalog
 from foodapi.models import Ingredient
 
 DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
+READ_SIZE = 64 * 2 ** 10
+
+
+def iter_json_array(file):
+    """Построчно отдаёт элементы JSON-массива, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    eof = False
+    while True:
+        buffer = buffer.lstrip()
+        if not started:
+            if buffer.startswith('['):
+                buffer = buffer[1:]
+                started = True
+                continue
+        elif buffer.startswith(','):
+            buffer = buffer[1:]
+            continue
+        elif buffer.startswith(']'):
+            return
+        elif buffer:
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield item
+                buffer = buffer[end:]
+                continue
+        if eof:
+            raise CommandError('Файл с ингредиентами оборван!')
+        chunk = file.read(READ_SIZE)
+        eof = not chunk
+        buffer += chunk
+
+
+def iter_json(file):
+    for item in iter_json_array(file):
+        if isinstance(item, dict):
+            yield item.get('name'), item.get('measurement_unit')
+        else:
+            yield None
+
+
+def iter_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield tuple(row[:2])
+
+
+READERS = {
+    '.json': iter_json,
+    '.csv': iter_csv,
+}
 
 
 class Command(BaseCommand):
-    """Загрузка игридиентов из json файла."""
+    """Загрузка ингредиентов из json или csv файла.
+
+    Файл читается потоково, ингредиенты вставляются пачками, уже
+    существующие пары (название, единица измерения) пропускаются,
+    так что повторный запуск не создаёт дублей. Неполные и
+    некорректные строки пропускаются и учитываются в отчёте.
+    """
 
     def add_arguments(self, parser):
         parser.add_argument('filename', default='ingredients.json', nargs='?',
                             type=str)
+        parser.add_argument('--batch-size', default=1000, type=int)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать новые ингредиенты.')
 
     def handle(self, *args, **options):
+        path = os.path.join(DATA_ROOT, options['filename'])
+        reader = READERS.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы json и csv!')
+        started = time.monotonic()
+        total = created = skipped = 0
         try:
-            with open(
-                    os.path.join(
-                        DATA_ROOT,
-                        options['filename']),
-                    'r',
-                    encoding='utf-8',
-            ) as f:
-                data = json.load(f)
-                for ingredient in data:
-                    try:
-                        Ingredient.objects.create(
-                            name=ingredient["name"],
-                            measurement_unit=ingredient["measurement_unit"],
-                        )
-                    except IntegrityError:
-                        print(
-                            f'{ingredient["name"]} уже есть в базе данных!'
-                        )
-            print('Данные загружены!')
+            with open(path, 'r', encoding='utf-8') as f:
+                batch = set()
+                for row in reader(f):
+                    total += 1
+                    if not self.valid(row):
+                        skipped += 1
+                        continue
+                    name, measurement_unit = row
+                    batch.add((name.strip(), measurement_unit.strip()))
+                    if len(batch) >= options['batch_size']:
+                        created += self.load_batch(batch, options['dry_run'])
+                        batch = set()
+                if batch:
+                    created += self.load_batch(batch, options['dry_run'])
         except FileNotFoundError:
             raise CommandError(
                 'Нет файла для загрузки данных! Проверьте папку data!'
             )
+        if created and not options['dry_run']:
+            ingredients_catalog.invalidate()
+        elapsed = time.monotonic() - started
+        rate = total / elapsed if elapsed else total
+        action = 'Будет добавлено' if options['dry_run'] else 'Добавлено'
+        self.stdout.write(
+            f'Прочитано {total}, {action.lower()} {created} ингредиентов, '
+            f'пропущено строк: {skipped} '
+            f'за {elapsed:.2f} с ({rate:.0f} строк/с).'
+        )
+        if not options['dry_run']:
+            self.stdout.write('Данные загружены!')
+
+    def valid(self, row):
+        """Строка из двух непустых полей, влезающих в модель."""
+        if row is None or len(row) != 2:
+            return False
+        return all(
+            isinstance(value, str)
+            and value.strip()
+            and len(value.strip()) <= Ingredient._meta.get_field(
+                field).max_length
+            for value, field in zip(row, ('name', 'measurement_unit'))
+        )
+
+    def load_batch(self, batch, dry_run):
+        names = {name for name, _ in batch}
+        existing = set(Ingredient.objects.filter(
+            name__in=names).values_list('name', 'measurement_unit'))
+        new = batch - existing
+        if new and not dry_run:
+            with transaction.atomic():
+                Ingredient.objects.bulk_create([
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in new
+                ], ignore_conflicts=True)
+        return len(new)
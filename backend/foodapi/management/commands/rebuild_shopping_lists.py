@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from foodapi.models import CartIngredient
+
+
+class Command(BaseCommand):
+    """Пересборка и проверка агрегированных списков покупок."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Только сверить данные, ничего не меняя.')
+
+    def handle(self, *args, **options):
+        live = CartIngredient.objects.live_totals()
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in
+            CartIngredient.objects.values_list(
+                'user_id', 'ingredient_id', 'amount')
+        }
+        mismatches = [
+            key for key in live.keys() | stored.keys()
+            if live.get(key) != stored.get(key)
+        ]
+        for user_id, ingredient_id in sorted(mismatches):
+            self.stdout.write(
+                f'user={user_id} ingredient={ingredient_id}: '
+                f'ожидалось {live.get((user_id, ingredient_id))}, '
+                f'сохранено {stored.get((user_id, ingredient_id))}'
+            )
+        if options['check']:
+            if mismatches:
+                raise CommandError(
+                    f'Расхождений в списках покупок: {len(mismatches)}'
+                )
+            self.stdout.write('Списки покупок совпадают с корзинами.')
+            return
+        count = CartIngredient.objects.rebuild()
+        self.stdout.write(f'Списки покупок пересобраны, записей: {count}.')
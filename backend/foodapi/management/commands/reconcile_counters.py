@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from foodapi.models import Cart, Favorite, Follow, Recipe, UserStats
+
+User = get_user_model()
+
+
+def count_of(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')
+    ), Value(0))
+
+
+COUNTERS = (
+    (Recipe, {
+        'favorites_count': (Favorite, 'recipe'),
+        'carts_count': (Cart, 'recipe'),
+    }),
+    (UserStats, {
+        'recipes_count': (Recipe, 'author'),
+        'followers_count': (Follow, 'author'),
+    }),
+)
+
+
+class Command(BaseCommand):
+    """Сверка и исправление денормализованных счётчиков."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Только сверить счётчики, ничего не меняя.')
+
+    def handle(self, *args, **options):
+        missing = User.objects.filter(stats__isnull=True)
+        drift = missing.count()
+        self.stdout.write(f'Пользователей без статистики: {drift}')
+        if drift and not options['check']:
+            UserStats.objects.bulk_create([
+                UserStats(user_id=user_id)
+                for user_id in missing.values_list('pk', flat=True)
+            ], batch_size=1000, ignore_conflicts=True)
+        with transaction.atomic():
+            for model, counters in COUNTERS:
+                actual = {
+                    f'actual_{field}': count_of(*source)
+                    for field, source in counters.items()
+                }
+                condition = Q()
+                for field in counters:
+                    condition |= ~Q(**{field: F(f'actual_{field}')})
+                stale = model.objects.annotate(**actual).filter(condition)
+                count = stale.count()
+                drift += count
+                self.stdout.write(
+                    f'{model._meta.verbose_name_plural}: '
+                    f'расхождений {count}'
+                )
+                if count and not options['check']:
+                    model.objects.filter(
+                        pk__in=stale.values('pk')
+                    ).update(**{
+                        field: count_of(*source)
+                        for field, source in counters.items()
+                    })
+        if options['check'] and drift:
+            raise CommandError(f'Найдено расхождений: {drift}')
@@ -0,0 +1,181 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foodapi.cache import (ingredients_catalog, recipe_responses,
+                           tags_catalog)
+from foodapi.models import (Cart, CartIngredient, Favorite, Follow,
+                            Ingredient, IngredientsAmount, Recipe, Tag)
+from foodapi.search import update_recipe_search
+
+User = get_user_model()
+
+BENCH_PREFIX = 'bench_'
+BENCH_PASSWORD = 'bench-password'
+UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+WORDS = (
+    'борщ', 'суп', 'салат', 'пирог', 'каша', 'рагу', 'котлеты', 'блины',
+    'запеканка', 'плов', 'омлет', 'соус', 'паста', 'овощи', 'курица',
+    'говядина', 'рыба', 'грибы', 'сыр', 'ягоды', 'домашний', 'быстрый',
+    'постный', 'праздничный', 'острый', 'сладкий', 'летний', 'зимний',
+)
+
+
+class Command(BaseCommand):
+    """Детерминированная генерация данных для бенчмарков.
+
+    Создаёт пользователей с префиксом bench_, теги, ингредиенты, рецепты,
+    подписки, избранное и корзины. При одинаковом --seed результат
+    одинаков, поэтому замеры разных коммитов можно сравнивать.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', default=100, type=int)
+        parser.add_argument('--recipes', default=1000, type=int)
+        parser.add_argument('--ingredients', default=500, type=int)
+        parser.add_argument('--tags', default=8, type=int)
+        parser.add_argument('--follows', default=10, type=int,
+                            help='Подписок на пользователя.')
+        parser.add_argument('--favorites', default=20, type=int,
+                            help='Рецептов в избранном у пользователя.')
+        parser.add_argument('--carts', default=5, type=int,
+                            help='Рецептов в корзине у пользователя.')
+        parser.add_argument('--seed', default=42, type=int)
+        parser.add_argument('--batch-size', default=1000, type=int)
+        parser.add_argument('--clear', action='store_true',
+                            help='Удалить ранее созданные данные bench_.')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.monotonic()
+        if options['clear']:
+            self.clear()
+        with transaction.atomic():
+            tag_ids = self.create_tags(options['tags'])
+            ingredient_ids = self.create_ingredients(options['ingredients'])
+            user_ids = self.create_users(options['users'])
+            recipe_ids = self.create_recipes(
+                user_ids, tag_ids, ingredient_ids, options['recipes'])
+            self.create_follows(user_ids, options['follows'])
+            self.create_links(Favorite, user_ids, recipe_ids,
+                              options['favorites'])
+            self.create_links(Cart, user_ids, recipe_ids, options['carts'])
+        recipe_responses.invalidate()
+        tags_catalog.invalidate()
+        ingredients_catalog.invalidate()
+        call_command('reconcile_counters', stdout=self.stdout)
+        CartIngredient.objects.rebuild(user_ids)
+        for start in range(0, len(recipe_ids), self.batch_size):
+            update_recipe_search(recipe_ids[start:start + self.batch_size])
+        self.stdout.write(
+            f'Создано пользователей: {len(user_ids)}, '
+            f'рецептов: {len(recipe_ids)} '
+            f'за {time.monotonic() - started:.2f} с.'
+        )
+
+    def clear(self):
+        users = User.objects.filter(username__startswith=BENCH_PREFIX)
+        recipe_ids = list(Recipe.objects.filter(
+            author__in=users).values_list('pk', flat=True))
+        for start in range(0, len(recipe_ids), self.batch_size):
+            batch = recipe_ids[start:start + self.batch_size]
+            Recipe.objects.filter(pk__in=batch).delete()
+        deleted, _ = users.delete()
+        self.stdout.write(f'Удалено объектов bench_: {deleted}')
+
+    def create_tags(self, count):
+        Tag.objects.bulk_create([
+            Tag(
+                name=f'Тег {i}',
+                slug=f'{BENCH_PREFIX}tag_{i}',
+                color=f'#{self.random.randrange(0x1000000):06X}',
+            )
+            for i in range(count)
+        ], ignore_conflicts=True)
+        return list(Tag.objects.filter(
+            slug__startswith=BENCH_PREFIX).values_list('pk', flat=True))
+
+    def create_ingredients(self, count):
+        Ingredient.objects.bulk_create([
+            Ingredient(
+                name=f'{self.random.choice(WORDS)} {i}',
+                measurement_unit=self.random.choice(UNITS),
+            )
+            for i in range(count)
+        ], batch_size=self.batch_size, ignore_conflicts=True)
+        return list(Ingredient.objects.order_by('pk').values_list(
+            'pk', flat=True)[:max(count, 1)])
+
+    def create_users(self, count):
+        password = make_password(BENCH_PASSWORD)
+        start = User.objects.filter(
+            username__startswith=BENCH_PREFIX).count()
+        User.objects.bulk_create([
+            User(
+                username=f'{BENCH_PREFIX}{i}',
+                email=f'{BENCH_PREFIX}{i}@example.com',
+                first_name=f'Имя {i}',
+                last_name=f'Фамилия {i}',
+                password=password,
+            )
+            for i in range(start, start + count)
+        ], batch_size=self.batch_size)
+        return list(User.objects.filter(
+            username__startswith=BENCH_PREFIX
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def create_recipes(self, user_ids, tag_ids, ingredient_ids, count):
+        created = []
+        for start in range(0, count, self.batch_size):
+            recipes = Recipe.objects.bulk_create([
+                Recipe(
+                    author_id=self.random.choice(user_ids),
+                    name=' '.join(self.random.sample(WORDS, 3)).capitalize(),
+                    text=' '.join(self.random.choices(WORDS, k=40)),
+                    cooking_time=self.random.randint(5, 180),
+                    image='recipes/images/bench.png',
+                )
+                for _ in range(start, min(start + self.batch_size, count))
+            ])
+            IngredientsAmount.objects.bulk_create([
+                IngredientsAmount(
+                    recipe_id=recipe.pk,
+                    ingredient_id=ingredient_id,
+                    amount=self.random.randint(1, 500),
+                )
+                for recipe in recipes
+                for ingredient_id in self.random.sample(
+                    ingredient_ids, min(len(ingredient_ids),
+                                        self.random.randint(3, 10)))
+            ], batch_size=self.batch_size)
+            Recipe.tags.through.objects.bulk_create([
+                Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+                for recipe in recipes
+                for tag_id in self.random.sample(
+                    tag_ids, min(len(tag_ids), self.random.randint(1, 3)))
+            ], batch_size=self.batch_size)
+            created.extend(recipe.pk for recipe in recipes)
+        return created
+
+    def create_follows(self, user_ids, per_user):
+        Follow.objects.bulk_create([
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in self.random.sample(
+                user_ids, min(len(user_ids), per_user + 1))
+            if author_id != user_id
+        ], batch_size=self.batch_size, ignore_conflicts=True)
+
+    def create_links(self, model, user_ids, recipe_ids, per_user):
+        model.objects.bulk_create([
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in self.random.sample(
+                recipe_ids, min(len(recipe_ids), per_user))
+        ], batch_size=self.batch_size, ignore_conflicts=True)
@@ -0,0 +1,224 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+ARCHIVE_FILE = 'metrics-archive.json'
+
+METRICS = {
+    'foodgram_requests_total': (
+        'counter', 'Число обработанных запросов.'),
+    'foodgram_request_duration_seconds': (
+        'histogram', 'Время обработки запроса.'),
+    'foodgram_request_db_queries': (
+        'histogram', 'Число SQL-запросов на один HTTP-запрос.'),
+    'foodgram_catalog_cache_requests_total': (
+        'counter', 'Обращения к кэшу справочников по результату.'),
+    'foodgram_image_queue_depth': (
+        'gauge', 'Картинки, ожидающие нарезки превью.'),
+}
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"')
+         .replace('\n', r'\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsStore:
+    """Метрики процесса с периодическим сбросом в общий каталог.
+
+    Каждый процесс gunicorn пишет свои значения в отдельный файл
+    METRICS_DIR/metrics-<pid>.json, эндпоинт метрик складывает файлы
+    всех процессов. Счётчики и гистограммы суммируются по всем файлам,
+    значения gauge - только по живым процессам. Файл завершившегося
+    воркера переносится в общий архив, чтобы суммы не уменьшались.
+    """
+
+    def __init__(self):
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.gauges = {}
+        self._flushed = 0
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self):
+        return Path(settings.METRICS_DIR)
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self.counters[(name, label_key(labels))] += value
+
+    def observe(self, name, value, buckets, **labels):
+        key = (name, label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {
+                    'buckets': buckets,
+                    'counts': [0] * len(buckets),
+                    'sum': 0,
+                    'count': 0,
+                }
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['counts'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def register_gauge(self, name, callback):
+        self.gauges[name] = callback
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'counters': [
+                    [name, labels, value]
+                    for (name, labels), value in self.counters.items()
+                ],
+                'histograms': [
+                    [name, labels, dict(histogram,
+                                        counts=list(histogram['counts']))]
+                    for (name, labels), histogram in self.histograms.items()
+                ],
+                'gauges': [
+                    [name, [], callback()]
+                    for name, callback in self.gauges.items()
+                ],
+            }
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._flushed < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self._flushed = now
+        self.write(self.directory / f'metrics-{os.getpid()}.json',
+                   self.snapshot())
+
+    def write(self, path, data):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix('.tmp')
+        temporary.write_text(json.dumps(data))
+        os.replace(temporary, path)
+
+    def collect(self):
+        """Сводит метрики всех процессов."""
+        self.flush(force=True)
+        return self.read(self.directory.glob('metrics-*.json'))
+
+    def archive_process(self, pid):
+        """Переносит счётчики завершившегося процесса в архив."""
+        path = self.directory / f'metrics-{pid}.json'
+        if not path.exists():
+            return
+        archive = self.directory / ARCHIVE_FILE
+        counters, histograms, _ = self.read([archive, path])
+        self.write(archive, {
+            'pid': 0,
+            'counters': [
+                [name, labels, value]
+                for (name, labels), value in counters.items()
+            ],
+            'histograms': [
+                [name, labels, histogram]
+                for (name, labels), histogram in histograms.items()
+            ],
+            'gauges': [],
+        })
+        path.unlink(missing_ok=True)
+
+    def clear(self):
+        """Удаляет файлы метрик, оставшиеся от прошлого запуска."""
+        for path in self.directory.glob('metrics-*'):
+            path.unlink(missing_ok=True)
+
+    def read(self, paths):
+        counters = defaultdict(float)
+        histograms = {}
+        gauges = defaultdict(float)
+        for path in paths:
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in data['counters']:
+                counters[(name, tuple(map(tuple, labels)))] += value
+            for name, labels, histogram in data['histograms']:
+                key = (name, tuple(map(tuple, labels)))
+                merged = histograms.setdefault(key, {
+                    'buckets': histogram['buckets'],
+                    'counts': [0] * len(histogram['buckets']),
+                    'sum': 0,
+                    'count': 0,
+                })
+                for index, count in enumerate(histogram['counts']):
+                    merged['counts'][index] += count
+                merged['sum'] += histogram['sum']
+                merged['count'] += histogram['count']
+            if data['gauges'] and process_alive(data['pid']):
+                for name, labels, value in data['gauges']:
+                    gauges[(name, tuple(map(tuple, labels)))] += value
+        return counters, histograms, gauges
+
+
+def render_metrics(counters, histograms, gauges):
+    """Форматирует метрики в текстовом формате Prometheus."""
+    series = defaultdict(list)
+    for (name, labels), value in sorted(counters.items()):
+        series[name].append(f'{name}{format_labels(labels)} {value:g}')
+    for (name, labels), value in sorted(gauges.items()):
+        series[name].append(f'{name}{format_labels(labels)} {value:g}')
+    for (name, labels), histogram in sorted(histograms.items()):
+        for bound, count in zip(histogram['buckets'], histogram['counts']):
+            series[name].append(
+                f'{name}_bucket{format_labels(labels + (("le", bound),))} '
+                f'{count}'
+            )
+        series[name].append(
+            f'{name}_bucket{format_labels(labels + (("le", "+Inf"),))} '
+            f'{histogram["count"]}'
+        )
+        series[name].append(
+            f'{name}_sum{format_labels(labels)} {histogram["sum"]:g}')
+        series[name].append(
+            f'{name}_count{format_labels(labels)} {histogram["count"]}')
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(series.get(name, ()))
+    return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsStore()
@@ -0,0 +1,292 @@
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from rest_framework.permissions import SAFE_METHODS
+
+from .metrics import DURATION_BUCKETS, QUERY_BUCKETS, metrics
+from .routers import RoutingState, routing_state
+
+logger = logging.getLogger('foodapi.queries')
+sample_logger = logging.getLogger('foodapi.queries.sample')
+
+PLACEHOLDER_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+SPACES = re.compile(r'\s+')
+
+active_profiles = ContextVar('active_profiles', default=())
+
+
+def fingerprint(sql):
+    """Нормализует SQL, чтобы одинаковые по форме запросы совпадали."""
+    sql = LITERAL.sub('?', sql)
+    sql = PLACEHOLDER_LIST.sub('(...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+def profile_queries(execute, sql, params, many, context):
+    """execute_wrapper, передающий запрос профилям текущего контекста."""
+    profiles = active_profiles.get()
+    if not profiles:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        for profile in profiles:
+            profile.record(sql, duration)
+
+
+def install_query_profiler(connection):
+    if profile_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(profile_queries)
+
+
+@receiver(connection_created)
+def connection_profiled(sender, connection, **kwargs):
+    install_query_profiler(connection)
+
+
+class QueryCounter:
+    """Число и суммарное время SQL-запросов."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def record(self, sql, duration):
+        self.count += 1
+        self.duration += duration
+
+
+class QueryProfile(QueryCounter):
+    """Счётчик запросов с подсчётом повторяющихся SQL."""
+
+    def __init__(self):
+        super().__init__()
+        self.fingerprints = Counter()
+
+    def record(self, sql, duration):
+        super().record(sql, duration)
+        self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self):
+        return {
+            sql: count for sql, count in self.fingerprints.most_common()
+            if count > 1
+        }
+
+
+class ContextMiddleware:
+    """Основа middleware, работающих и в WSGI, и в ASGI.
+
+    Состояние запроса хранится в contextvar, который asgiref передаёт
+    в потоки с синхронными частями запроса, в том числе в потоки
+    async_view.
+    """
+    sync_capable = True
+    async_capable = True
+    enabled_setting = None
+
+    def __init__(self, get_response):
+        if self.enabled_setting and not getattr(
+                settings, self.enabled_setting):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        state = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.stop(state)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.stop(state)
+        return self.finish(request, response, state)
+
+    def start(self, request):
+        return None
+
+    def stop(self, state):
+        pass
+
+    def finish(self, request, response, state):
+        return response
+
+
+class ProfilingMiddleware(ContextMiddleware):
+    """Основа middleware, собирающих статистику SQL-запросов."""
+    profile_class = QueryCounter
+
+    def start(self, request):
+        for connection in connections.all():
+            install_query_profiler(connection)
+        profile = self.profile_class()
+        token = active_profiles.set(active_profiles.get() + (profile,))
+        return profile, token, time.perf_counter()
+
+    def stop(self, state):
+        active_profiles.reset(state[1])
+
+    def finish(self, request, response, state):
+        profile, _, started = state
+        return self.report(
+            request, response, profile, time.perf_counter() - started
+        )
+
+    def report(self, request, response, profile, duration):
+        raise NotImplementedError
+
+
+class QueryProfilingMiddleware(ProfilingMiddleware):
+    """Профилирование SQL-запросов в рамках HTTP-запроса.
+
+    Включается настройкой QUERY_PROFILING и не зависит от DEBUG.
+    Добавляет заголовки Server-Timing и X-DB-Queries, пишет в лог
+    запросы, превысившие пороги, и выборку всех запросов
+    с долей QUERY_PROFILING_SAMPLE_RATE. Запросы, выполненные при
+    отдаче потокового ответа, не учитываются.
+    """
+    enabled_setting = 'QUERY_PROFILING'
+    profile_class = QueryProfile
+
+    def report(self, request, response, profile, duration):
+        db_ms = profile.duration * 1000
+        total_ms = duration * 1000
+        duplicates = profile.duplicates
+        response['X-DB-Queries'] = str(profile.count)
+        response['Server-Timing'] = (
+            f'db;dur={db_ms:.1f};desc="{profile.count} queries", '
+            f'app;dur={total_ms:.1f}'
+        )
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': profile.count,
+            'db_ms': round(db_ms, 2),
+            'total_ms': round(total_ms, 2),
+            'duplicates': sum(duplicates.values()) - len(duplicates),
+        }
+        if (
+            profile.count > settings.QUERY_PROFILING_MAX_QUERIES
+            or db_ms > settings.QUERY_PROFILING_MAX_DB_TIME
+            or record['duplicates'] > settings.QUERY_PROFILING_MAX_DUPLICATES
+        ):
+            logger.warning(
+                '%s %s: %s запросов, %.1f мс в БД, повторов %s; %s',
+                request.method, request.path, profile.count, db_ms,
+                record['duplicates'], list(duplicates.items())[:3],
+            )
+        if random.random() < settings.QUERY_PROFILING_SAMPLE_RATE:
+            record['top_duplicates'] = [
+                {'sql': sql, 'count': count}
+                for sql, count in list(duplicates.items())[:5]
+            ]
+            sample_logger.info(json.dumps(record, ensure_ascii=False))
+        return response
+
+
+def view_name(view_func, method):
+    """Имя обработчика для меток: ViewSet.action или путь к функции."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+class MetricsMiddleware(ProfilingMiddleware):
+    """Сбор метрик запросов для эндпоинта /api/metrics.
+
+    Для каждого обработчика копит число запросов, гистограммы времени
+    ответа и числа SQL-запросов. Включается настройкой METRICS_ENABLED.
+    """
+    enabled_setting = 'METRICS_ENABLED'
+
+    def report(self, request, response, profile, duration):
+        view = getattr(request, 'metrics_view', 'unmatched')
+        metrics.inc('foodgram_requests_total', view=view,
+                    method=request.method,
+                    status=f'{response.status_code // 100}xx')
+        metrics.observe('foodgram_request_duration_seconds', duration,
+                        DURATION_BUCKETS, view=view)
+        metrics.observe('foodgram_request_db_queries', profile.count,
+                        QUERY_BUCKETS, view=view)
+        metrics.flush()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = view_name(view_func, request.method)
+
+
+class ReplicaRoutingMiddleware(ContextMiddleware):
+    """Направляет безопасные запросы к разрешённым действиям на реплики.
+
+    Действия перечислены в атрибуте replica_actions вьюсета. После
+    успешного изменяющего запроса клиент с тем же токеном
+    REPLICA_STICKY_SECONDS секунд читает с основной БД, чтобы видеть
+    свои изменения несмотря на отставание реплик.
+    """
+    enabled_setting = 'DATABASE_REPLICAS'
+
+    def sticky_key(self, request):
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+        if not authorization:
+            return None
+        digest = hashlib.sha256(authorization.encode()).hexdigest()
+        return f'replica:sticky:{digest}'
+
+    def start(self, request):
+        state = RoutingState()
+        return state, routing_state.set(state)
+
+    def stop(self, state):
+        routing_state.reset(state[1])
+
+    def finish(self, request, response, state):
+        key = self.sticky_key(request)
+        if (
+            key is not None and request.method not in SAFE_METHODS
+            and response.status_code < 400
+        ):
+            cache.set(key, True, settings.REPLICA_STICKY_SECONDS)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in SAFE_METHODS:
+            return
+        view_class = getattr(view_func, 'cls', None)
+        actions = getattr(view_func, 'actions', None) or {}
+        action = actions.get(request.method.lower())
+        if action not in getattr(view_class, 'replica_actions', ()):
+            return
+        key = self.sticky_key(request)
+        if key is not None and cache.get(key):
+            return
+        routing_state.get().use_replica = True
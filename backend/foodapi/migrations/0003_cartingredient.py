@@ -0,0 +1,111 @@
+# Generated by Django 4.0.4 on 2026-10-17 05:47
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+
+def fill_cart_ingredients(apps, schema_editor):
+    CartIngredient = apps.get_model('foodapi', 'CartIngredient')
+    IngredientsAmount = apps.get_model('foodapi', 'IngredientsAmount')
+    totals = IngredientsAmount.objects.filter(
+        recipe__carts__isnull=False
+    ).values_list(
+        'recipe__carts__user', 'ingredient'
+    ).annotate(total=Sum('amount')).order_by()
+    CartIngredient.objects.bulk_create([
+        CartIngredient(user_id=user_id, ingredient_id=ingredient_id,
+                       amount=total)
+        for user_id, ingredient_id, total in totals
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('foodapi', '0002_rename_hex_color_tag_color'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='cart',
+            options={'ordering': ['id'],
+                     'verbose_name': 'Корзина',
+                     'verbose_name_plural': 'Корзины'},
+        ),
+        migrations.AlterModelOptions(
+            name='favorite',
+            options={'ordering': ['id'],
+                     'verbose_name': 'Избранное',
+                     'verbose_name_plural': 'Избранные'},
+        ),
+        migrations.AlterModelOptions(
+            name='follow',
+            options={'ordering': ['id'],
+                     'verbose_name': 'Подписка',
+                     'verbose_name_plural': 'Подписки'},
+        ),
+        migrations.AlterModelOptions(
+            name='ingredient',
+            options={'ordering': ['id'],
+                     'verbose_name': 'Ингредиент',
+                     'verbose_name_plural': 'Ингредиенты'},
+        ),
+        migrations.AlterModelOptions(
+            name='ingredientsamount',
+            options={'ordering': ['id'],
+                     'verbose_name': 'Количество ингредиента',
+                     'verbose_name_plural': 'Количество ингредиентов'},
+        ),
+        migrations.AlterModelOptions(
+            name='recipe',
+            options={'ordering': ['id'],
+                     'verbose_name': 'Рецепт',
+                     'verbose_name_plural': 'Рецепты'},
+        ),
+        migrations.AlterModelOptions(
+            name='tag',
+            options={'ordering': ['id'],
+                     'verbose_name': 'Тег',
+                     'verbose_name_plural': 'Теги'},
+        ),
+        migrations.CreateModel(
+            name='CartIngredient',
+            fields=[
+                ('id',
+                 models.BigAutoField(auto_created=True,
+                                     primary_key=True,
+                                     serialize=False,
+                                     verbose_name='ID')),
+                ('amount',
+                 models.IntegerField(verbose_name='Кол-во ингредиента')),
+                ('ingredient',
+                 models.ForeignKey(
+                     on_delete=django.db.models.deletion.CASCADE,
+                     related_name='cart_ingredients',
+                     to='foodapi.ingredient',
+                     verbose_name='Ингредиент')),
+                ('user',
+                 models.ForeignKey(
+                     on_delete=django.db.models.deletion.CASCADE,
+                     related_name='cart_ingredients',
+                     to=settings.AUTH_USER_MODEL,
+                     verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент в списке покупок',
+                'verbose_name_plural': 'Список покупок',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cartingredient',
+            constraint=models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique relationship between user and cart ingredient'),
+        ),
+        migrations.RunPython(fill_cart_ingredients,
+                             migrations.RunPython.noop),
+    ]
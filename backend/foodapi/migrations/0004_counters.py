@@ -0,0 +1,84 @@
+# Generated by Django 4.0.4 on 2026-10-17 05:48
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def count_of(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')
+    ), Value(0))
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('foodapi', 'Recipe')
+    Favorite = apps.get_model('foodapi', 'Favorite')
+    Cart = apps.get_model('foodapi', 'Cart')
+    Follow = apps.get_model('foodapi', 'Follow')
+    UserStats = apps.get_model('foodapi', 'UserStats')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Recipe.objects.update(
+        favorites_count=count_of(Favorite, 'recipe'),
+        carts_count=count_of(Cart, 'recipe'),
+    )
+    UserStats.objects.bulk_create([
+        UserStats(user_id=user_id)
+        for user_id in User.objects.values_list('pk', flat=True)
+    ], batch_size=1000)
+    UserStats.objects.update(
+        recipes_count=count_of(Recipe, 'author'),
+        followers_count=count_of(Follow, 'author'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('foodapi', '0003_cartingredient'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user',
+                 models.OneToOneField(
+                     on_delete=django.db.models.deletion.CASCADE,
+                     primary_key=True,
+                     related_name='stats',
+                     serialize=False,
+                     to=settings.AUTH_USER_MODEL,
+                     verbose_name='Пользователь')),
+                ('recipes_count',
+                 models.PositiveIntegerField(default=0,
+                                             verbose_name='Рецептов')),
+                ('followers_count',
+                 models.PositiveIntegerField(default=0,
+                                             verbose_name='Подписчиков')),
+            ],
+            options={
+                'verbose_name': 'Статистика пользователя',
+                'verbose_name_plural': 'Статистика пользователей',
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='carts_count',
+            field=models.PositiveIntegerField(default=0,
+                                              editable=False,
+                                              verbose_name='В корзинах'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0,
+                                              editable=False,
+                                              verbose_name='В избранном'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
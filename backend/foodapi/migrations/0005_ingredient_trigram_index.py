@@ -0,0 +1,36 @@
+# Generated by Django 4.0.4 on 2026-10-17 06:02
+
+from django.db import migrations
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS foodapi_ingredient_name_trgm '
+        'ON foodapi_ingredient USING gin (name gin_trgm_ops)'
+    )
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS foodapi_ingredient_upper_name_trgm '
+        'ON foodapi_ingredient USING gin (UPPER(name) gin_trgm_ops)'
+    )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS foodapi_ingredient_upper_name_trgm')
+    schema_editor.execute('DROP INDEX IF EXISTS foodapi_ingredient_name_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapi', '0004_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
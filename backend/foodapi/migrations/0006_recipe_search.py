@@ -0,0 +1,55 @@
+# Generated by Django 4.0.4 on 2026-10-17 05:52
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS foodapi_recipe_search_vector_gin '
+            'ON foodapi_recipe USING gin (search_vector)'
+        )
+        schema_editor.execute(
+            "UPDATE foodapi_recipe SET search_vector = "
+            "setweight(to_tsvector('russian', COALESCE(name, '')), 'A') || "
+            "setweight(to_tsvector('russian', COALESCE(text, '')), 'B')"
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS foodapi_recipe_fts '
+            "USING fts5(name, text, tokenize='unicode61')"
+        )
+        schema_editor.execute(
+            'INSERT INTO foodapi_recipe_fts (rowid, name, text) '
+            "SELECT id, name, COALESCE(text, '') FROM foodapi_recipe"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'DROP INDEX IF EXISTS foodapi_recipe_search_vector_gin')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS foodapi_recipe_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapi', '0005_ingredient_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False,
+                null=True,
+                verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
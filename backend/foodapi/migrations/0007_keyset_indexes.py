@@ -0,0 +1,23 @@
+# Generated by Django 4.0.4 on 2026-10-17 05:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapi', '0006_recipe_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['user', '-id'],
+                               name='follow_user_id_desc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-id'],
+                               name='recipe_author_id_desc_idx'),
+        ),
+    ]
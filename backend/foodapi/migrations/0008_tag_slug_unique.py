@@ -0,0 +1,37 @@
+# Generated by Django 4.0.4 on 2026-10-17 05:54
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def dedupe_tag_slugs(apps, schema_editor):
+    Tag = apps.get_model('foodapi', 'Tag')
+    duplicated = Tag.objects.values('slug').annotate(
+        total=Count('id')).filter(total__gt=1).values_list('slug', flat=True)
+    for tag in Tag.objects.filter(slug__in=list(duplicated)).order_by('id'):
+        if Tag.objects.filter(slug=tag.slug, id__lt=tag.id).exists():
+            tag.slug = f'{tag.slug}-{tag.id}'
+            tag.save(update_fields=['slug'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapi', '0007_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_tag_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tag',
+            name='slug',
+            field=models.SlugField(max_length=200,
+                                   unique=True,
+                                   verbose_name='Slug'),
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX foodapi_recipe_tags_tag_recipe_idx '
+            'ON foodapi_recipe_tags (tag_id, recipe_id)',
+            'DROP INDEX foodapi_recipe_tags_tag_recipe_idx',
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.0.4 on 2026-10-17 05:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapi', '0008_tag_slug_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.JSONField(blank=True,
+                                   default=dict,
+                                   editable=False,
+                                   verbose_name='Превью картинки'),
+        ),
+    ]
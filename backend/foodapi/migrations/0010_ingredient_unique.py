@@ -0,0 +1,53 @@
+# Generated by Django 4.0.4 on 2026-10-17 05:56
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('foodapi', 'Ingredient')
+    IngredientsAmount = apps.get_model('foodapi', 'IngredientsAmount')
+    CartIngredient = apps.get_model('foodapi', 'CartIngredient')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        total=Count('id'), keep_id=Min('id')
+    ).filter(total__gt=1)
+    for group in duplicates:
+        extra_ids = list(Ingredient.objects.filter(
+            name=group['name'],
+            measurement_unit=group['measurement_unit'],
+        ).exclude(id=group['keep_id']).values_list('id', flat=True))
+        for model, owner in ((IngredientsAmount, 'recipe_id'),
+                             (CartIngredient, 'user_id')):
+            for row in model.objects.filter(ingredient_id__in=extra_ids):
+                kept = model.objects.filter(
+                    ingredient_id=group['keep_id'],
+                    **{owner: getattr(row, owner)},
+                ).first()
+                if kept is None:
+                    row.ingredient_id = group['keep_id']
+                    row.save(update_fields=['ingredient'])
+                else:
+                    kept.amount += row.amount
+                    kept.save(update_fields=['amount'])
+                    row.delete()
+        Ingredient.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapi', '0009_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique ingredient name and measurement unit'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.0.4 on 2026-10-17 07:10
+
+from django.db import migrations, models
+
+
+def create_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS foodapi_ingredient_upper_name_like '
+        'ON foodapi_ingredient (UPPER(name) varchar_pattern_ops)'
+    )
+
+
+def drop_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS foodapi_ingredient_upper_name_like')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapi', '0010_ingredient_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['recipe', 'user'],
+                               name='cart_recipe_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['recipe', 'user'],
+                               name='favorite_recipe_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['author', 'user'],
+                               name='follow_author_user_idx'),
+        ),
+        migrations.RunPython(create_prefix_index, drop_prefix_index),
+    ]
@@ -1,5 +1,11 @@
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import (Count, Exists, ExpressionWrapper, F,
+                              FloatField, OuterRef, Prefetch, Q, Sum, Value,
+                              Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 
 User = get_user_model()
@@ -19,6 +25,12 @@ class Ingredient(models.Model):
         ordering = ['id']
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique ingredient name and measurement unit',
+            )
+        ]
 
     def __str__(self) -> str:
         return self.name
@@ -36,6 +48,7 @@ class Tag(models.Model):
     )
     slug = models.SlugField(
         max_length=200,
+        unique=True,
         verbose_name='Slug',
     )
 
@@ -48,6 +61,69 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Выборка рецептов с флагами текущего пользователя."""
+
+    def with_related(self):
+        return self.defer('search_vector').select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredientsamount_set',
+                queryset=IngredientsAmount.objects.select_related(
+                    'ingredient'),
+            ),
+        )
+
+    def limited_per_author(self, limit):
+        """Первые limit рецептов каждого автора одним запросом."""
+        ranked = self.annotate(author_rank=Window(
+            expression=RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=F('id').asc(),
+        )).order_by().values('id', 'author_rank')
+        sql, params = ranked.query.sql_with_params()
+        quote_name = connections[self.db].ops.quote_name
+        return self.filter(id__in=RawSQL(
+            f'SELECT {quote_name("id")} FROM ({sql}) ranked '
+            f'WHERE {quote_name("author_rank")} <= %s',
+            (*params, limit),
+        ))
+
+    def covering_ingredients(self, ingredient_ids):
+        """Рецепты с долей ингредиентов, входящих в ingredient_ids."""
+        return self.filter(
+            pk__in=IngredientsAmount.objects.filter(
+                ingredient__in=ingredient_ids).values('recipe')
+        ).annotate(
+            covered=Count('ingredientsamount', filter=Q(
+                ingredientsamount__ingredient__in=ingredient_ids)),
+            total=Count('ingredientsamount'),
+        ).annotate(
+            missing=F('total') - F('covered'),
+            coverage=ExpressionWrapper(
+                F('covered') * 1.0 / F('total'), output_field=FloatField()
+            ),
+        ).order_by('-coverage', 'missing', '-id')
+
+    def with_user_flags(self, user):
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+                author_is_subscribed=Value(False),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(Cart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            author_is_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('author'))),
+        )
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -84,11 +160,48 @@ class Recipe(models.Model):
         ],
         verbose_name='Время приготовления',
     )
+    pub_date = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата публикации',
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном',
+    )
+    carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В корзинах',
+    )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Превью картинки',
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор',
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ['id']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=['author', '-id'],
+                         name='recipe_author_id_desc_idx'),
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=['-favorites_count', '-id'],
+                         name='recipe_favorites_id_idx'),
+            models.Index(fields=['cooking_time', 'id'],
+                         name='recipe_cooking_time_id_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.name
@@ -112,6 +225,10 @@ class Favorite(models.Model):
         ordering = ['id']
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранные'
+        indexes = [
+            models.Index(fields=['recipe', 'user'],
+                         name='favorite_recipe_user_idx'),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'recipe'],
@@ -138,6 +255,10 @@ class Cart(models.Model):
         ordering = ['id']
         verbose_name = 'Корзина'
         verbose_name_plural = 'Корзины'
+        indexes = [
+            models.Index(fields=['recipe', 'user'],
+                         name='cart_recipe_user_idx'),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'recipe'],
@@ -194,9 +315,176 @@ class Follow(models.Model):
         ordering = ['id']
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        indexes = [
+            models.Index(fields=['user', '-id'],
+                         name='follow_user_id_desc_idx'),
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'author'],
                 name='unique follow'
             )
         ]
+
+
+class CartIngredientManager(models.Manager):
+    """Поддержка агрегированного списка покупок в актуальном состоянии."""
+
+    def add_recipe(self, user_id, recipe_id):
+        self.apply([user_id], recipe_amounts(recipe_id))
+
+    def remove_recipe(self, user_id, recipe_id):
+        amounts = recipe_amounts(recipe_id)
+        self.apply([user_id], {
+            ingredient: -amount for ingredient, amount in amounts.items()
+        })
+
+    def change_recipe(self, recipe_id, old_amounts, new_amounts):
+        changes = {
+            ingredient: new_amounts.get(ingredient, 0)
+            - old_amounts.get(ingredient, 0)
+            for ingredient in old_amounts.keys() | new_amounts.keys()
+        }
+        user_ids = list(Cart.objects.filter(
+            recipe_id=recipe_id).values_list('user_id', flat=True))
+        self.apply(user_ids, changes)
+
+    def apply(self, user_ids, changes):
+        changes = {
+            ingredient: delta for ingredient, delta in changes.items()
+            if delta
+        }
+        if not user_ids or not changes:
+            return
+        with transaction.atomic():
+            existing = {
+                (item.user_id, item.ingredient_id): item
+                for item in self.select_for_update().filter(
+                    user_id__in=user_ids, ingredient_id__in=changes)
+            }
+            to_update, to_create = [], []
+            for user_id in user_ids:
+                for ingredient_id, delta in changes.items():
+                    item = existing.get((user_id, ingredient_id))
+                    if item is not None:
+                        item.amount += delta
+                        to_update.append(item)
+                    elif delta > 0:
+                        to_create.append(self.model(
+                            user_id=user_id,
+                            ingredient_id=ingredient_id,
+                            amount=delta,
+                        ))
+            self.bulk_update(to_update, ['amount'])
+            self.bulk_create(to_create)
+            self.filter(
+                user_id__in=user_ids, amount__lte=0
+            ).delete()
+
+    def live_totals(self, user_ids=None):
+        """Суммы ингредиентов, посчитанные напрямую по корзинам."""
+        if user_ids is None:
+            lookup = {'recipe__carts__isnull': False}
+        else:
+            lookup = {'recipe__carts__user__in': user_ids}
+        queryset = IngredientsAmount.objects.filter(**lookup)
+        return {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in queryset.values_list(
+                'recipe__carts__user', 'ingredient'
+            ).annotate(total=Sum('amount')).order_by()
+        }
+
+    def rebuild(self, user_ids=None):
+        totals = self.live_totals(user_ids)
+        with transaction.atomic():
+            queryset = self.all()
+            if user_ids is not None:
+                queryset = queryset.filter(user_id__in=user_ids)
+            queryset.delete()
+            self.bulk_create([
+                self.model(
+                    user_id=user_id, ingredient_id=ingredient_id, amount=total
+                )
+                for (user_id, ingredient_id), total in totals.items()
+            ], batch_size=1000)
+        return len(totals)
+
+
+def recipe_amounts(recipe_id):
+    return dict(IngredientsAmount.objects.filter(
+        recipe_id=recipe_id).values_list('ingredient_id', 'amount'))
+
+
+class CartIngredient(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='cart_ingredients',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='cart_ingredients',
+        verbose_name='Ингредиент',
+    )
+    amount = models.IntegerField(
+        verbose_name='Кол-во ингредиента',
+    )
+
+    objects = CartIngredientManager()
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Список покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique relationship between user and cart ingredient',
+            )
+        ]
+
+
+class UserStatsManager(models.Manager):
+
+    def increment(self, user_id, field, delta=1):
+        updated = change_counter(
+            self.filter(user_id=user_id), field, delta)
+        if not updated and delta > 0:
+            self.get_or_create(user_id=user_id)
+            change_counter(self.filter(user_id=user_id), field, delta)
+
+
+def change_counter(queryset, field, delta):
+    """Атомарно сдвигает счётчик, не опуская его ниже нуля."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Рецептов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписчиков',
+    )
+
+    objects = UserStatsManager()
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
@@ -1,6 +1,167 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class ApproximateCountPaginator(Paginator):
+    """Пагинатор, не пересчитывающий COUNT(*) на каждой странице.
+
+    Для нефильтрованной выборки в PostgreSQL берётся оценка из
+    pg_class.reltuples, остальные подсчёты кэшируются на короткое время.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not settings.PAGINATION_APPROXIMATE_COUNT:
+            return super().count
+        estimate = self.estimated_count(queryset)
+        if estimate is not None:
+            return estimate
+        sql, params = queryset.query.sql_with_params()
+        digest = hashlib.md5(f'{sql}{params}'.encode()).hexdigest()
+        key = f'pagination:count:{digest}'
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count
+
+    def estimated_count(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql' or queryset.query.where:
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < settings.PAGINATION_ESTIMATE_THRESHOLD:
+            return None
+        return row[0]
+
+
+class LimitCursorPagination(CursorPagination):
+    """Курсор по составному ключу сортировки.
+
+    Стандартный курсор DRF хранит только первое поле сортировки и
+    смещение среди равных значений. Здесь позиция - значения всех полей
+    ключа, последнее из которых id, поэтому следующая страница
+    выбирается условием (поле, id) > (значение, id) без OFFSET.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = 'id'
+    keyset_orderings = (
+        ('id',), ('-id',),
+        ('-pub_date', '-id'), ('pub_date', 'id'),
+        ('-favorites_count', '-id'), ('favorites_count', 'id'),
+        ('cooking_time', 'id'), ('-cooking_time', '-id'),
+    )
+
+    def get_ordering(self, request, queryset, view):
+        ordering = tuple(
+            queryset.query.order_by or queryset.model._meta.ordering)
+        if ordering in self.keyset_orderings:
+            return ordering
+        return (self.ordering,)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = self.cursor.position if self.cursor else None
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(
+                field[1:] if field.startswith('-') else f'-{field}'
+                for field in ordering
+            )
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = self.filter_after(queryset, ordering, position)
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following = None
+        if len(results) > self.page_size:
+            following = self._get_position_from_instance(
+                results[-1], self.ordering)
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None
+            self.has_previous = following is not None
+            self.next_position, self.previous_position = position, following
+        else:
+            self.has_next = following is not None
+            self.has_previous = position is not None
+            self.next_position, self.previous_position = following, position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def filter_after(self, queryset, ordering, position):
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(ordering):
+                raise ValueError
+            condition, equal = Q(), {}
+            for field, value in zip(ordering, values):
+                name = field.lstrip('-')
+                lookup = 'lt' if field.startswith('-') else 'gt'
+                condition |= Q(**equal, **{f'{name}__{lookup}': value})
+                equal[name] = value
+            if len(ordering) > 1:
+                # Одно OR-условие не даёт индексу диапазон; нестрогое
+                # условие по первому полю задаёт его границу.
+                first = ordering[0]
+                lookup = 'lte' if first.startswith('-') else 'gte'
+                condition &= Q(**{f'{first.lstrip("-")}__{lookup}': values[0]})
+            return queryset.filter(condition)
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _get_position_from_instance(self, instance, ordering):
+        return json.dumps([
+            str(getattr(instance, field.lstrip('-'))) for field in ordering
+        ])
 
 
 class LimitPageNumberPagination(PageNumberPagination):
+    """Постраничная пагинация с переключением в режим курсора.
+
+    С параметром pagination=cursor выдача идёт по ключу сортировки без OFFSET
+    и без подсчёта общего количества.
+    """
     page_size = 6
     page_size_query_param = 'limit'
+    mode_query_param = 'pagination'
+    django_paginator_class = ApproximateCountPaginator
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.mode_query_param) == 'cursor':
+            self.cursor_paginator = LimitCursorPagination()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,57 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+routing_state = ContextVar('routing_state', default=None)
+
+PRIMARY_MODELS = {'authtoken.token'}
+
+
+class RoutingState:
+    """Решение о чтении с реплики для текущего запроса."""
+
+    def __init__(self):
+        self.use_replica = False
+
+
+@contextmanager
+def use_primary():
+    """Временно направляет чтения текущего запроса на основную БД."""
+    state = routing_state.get()
+    if state is None:
+        yield
+        return
+    previous, state.use_replica = state.use_replica, False
+    try:
+        yield
+    finally:
+        state.use_replica = previous
+
+
+class ReplicaRouter:
+    """Чтения разрешённых запросов идут на реплики, остальное - на default.
+
+    Реплика выбирается только для запросов, помеченных
+    ReplicaRoutingMiddleware. Токены всегда читаются с основной БД,
+    чтобы только что выданный токен сразу работал.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = routing_state.get()
+        if (
+            state is None or not state.use_replica
+            or model._meta.label_lower in PRIMARY_MODELS
+        ):
+            return 'default'
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,238 @@
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+from .cache import ingredients_catalog
+from .models import Ingredient, Recipe
+
+TRIGRAM_THRESHOLD = 0.3
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'foodapi_recipe_fts'
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class IngredientIndex:
+    """Индекс названий ингредиентов для автодополнения.
+
+    Префиксы ищутся бинарным поиском по отсортированному списку названий,
+    подстроки - перебором, опечатки - по совпадению триграмм.
+    """
+
+    def __init__(self, ingredients):
+        self.entries = sorted(
+            (name.lower(), pk) for pk, name in ingredients
+        )
+        self.names = [name for name, _ in self.entries]
+        self.trigrams = []
+        self.postings = defaultdict(list)
+        for position, name in enumerate(self.names):
+            grams = trigrams(name)
+            self.trigrams.append(len(grams))
+            for gram in grams:
+                self.postings[gram].append(position)
+
+    def search(self, query, limit):
+        query = query.strip().lower()
+        if not query:
+            return []
+        found = []
+        seen = set()
+
+        def add(position):
+            if position not in seen and len(found) < limit:
+                seen.add(position)
+                found.append(self.entries[position][1])
+
+        position = bisect_left(self.names, query)
+        while (position < len(self.names)
+               and self.names[position].startswith(query)
+               and len(found) < limit):
+            add(position)
+            position += 1
+        if len(found) < limit:
+            for position, name in enumerate(self.names):
+                if len(found) >= limit:
+                    break
+                if query in name:
+                    add(position)
+        if len(found) < limit and len(query) >= 3:
+            grams = trigrams(query)
+            shared = Counter(
+                position for gram in grams
+                for position in self.postings.get(gram, ())
+            )
+            scored = []
+            for position, common in shared.items():
+                similarity = common / (
+                    len(grams) + self.trigrams[position] - common)
+                if similarity >= TRIGRAM_THRESHOLD:
+                    scored.append((-similarity, self.names[position],
+                                   position))
+            for _, _, position in sorted(scored):
+                add(position)
+        return found
+
+
+class MemoryBackend:
+    """Поиск по индексу в памяти процесса."""
+
+    def __init__(self):
+        self._index = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get_index(self):
+        version = ingredients_catalog.version()
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self._index = IngredientIndex(
+                        Ingredient.objects.values_list('pk', 'name'))
+                    self._version = version
+        return self._index
+
+    def search(self, queryset, query, limit):
+        ids = self.get_index().search(query, limit)
+        if not ids:
+            return queryset.none()
+        return queryset.filter(pk__in=ids).order_by(Case(
+            *[When(pk=pk, then=Value(rank)) for rank, pk in enumerate(ids)],
+            output_field=IntegerField(),
+        ))
+
+
+class PostgresBackend:
+    """Поиск средствами pg_trgm по GIN-индексам на названии.
+
+    Запросы короче триграммы ищутся по префиксу через индекс
+    UPPER(name) varchar_pattern_ops.
+    """
+
+    def search(self, queryset, query, limit):
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        query = query.strip()
+        if not query:
+            return queryset.none()
+        if len(query) < 3:
+            return queryset.filter(
+                name__istartswith=query).order_by('name')[:limit]
+        return queryset.filter(
+            Q(name__icontains=query) | Q(name__trigram_similar=query)
+        ).annotate(
+            match_rank=Case(
+                When(name__istartswith=query, then=Value(0)),
+                When(name__icontains=query, then=Value(1)),
+                default=Value(2),
+                output_field=IntegerField(),
+            ),
+            similarity=TrigramSimilarity('name', query),
+        ).order_by('match_rank', '-similarity', 'name')[:limit]
+
+
+BACKENDS = {
+    'memory': MemoryBackend,
+    'postgres': PostgresBackend,
+}
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = BACKENDS[settings.INGREDIENT_SEARCH_BACKEND]()
+    return _backend
+
+
+def autocomplete_ingredients(queryset, query, limit=None):
+    """Ингредиенты по запросу: сначала префикс, затем подстрока и опечатки."""
+    return get_backend().search(
+        queryset, query, limit or settings.INGREDIENT_SEARCH_LIMIT
+    )
+
+
+def recipe_search_vector():
+    from django.contrib.postgres.search import SearchVector
+
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def update_recipe_search(recipe_ids):
+    """Обновляет поисковый индекс для указанных рецептов."""
+    recipe_ids = list(recipe_ids)
+    connection = connections[Recipe.objects.db]
+    if connection.vendor == 'postgresql':
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            search_vector=recipe_search_vector())
+    elif connection.vendor == 'sqlite':
+        delete_recipe_search(recipe_ids)
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+                f'SELECT id, name, COALESCE(text, \'\') '
+                f'FROM foodapi_recipe WHERE id IN ({placeholders})',
+                recipe_ids,
+            )
+
+
+def delete_recipe_search(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    connection = connections[Recipe.objects.db]
+    if connection.vendor != 'sqlite' or not recipe_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+            recipe_ids,
+        )
+
+
+def fts_match_expression(query):
+    """Запрос FTS5: все слова запроса как префиксы, без операторов."""
+    words = query.split()
+    return ' '.join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+
+def search_recipes(queryset, query):
+    """Рецепты, подходящие под запрос, по убыванию релевантности."""
+    query = query.strip()
+    if not query:
+        return queryset
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        search_query = SearchQuery(
+            query, config=SEARCH_CONFIG, search_type='websearch')
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query),
+        ).order_by('-search_rank', '-id')
+    if vendor == 'sqlite':
+        # Таблица FTS5 присоединяется к выборке: MATCH выполняется один
+        # раз, rank (bm25) берётся из неё же, без подзапроса на строку.
+        return queryset.extra(
+            select={'search_rank': f'{FTS_TABLE}.rank'},
+            tables=[FTS_TABLE],
+            where=[
+                f'{FTS_TABLE}.rowid = foodapi_recipe.id',
+                f'{FTS_TABLE} MATCH %s',
+            ],
+            params=[fts_match_expression(query)],
+        ).order_by('search_rank', '-id')
+    return queryset.filter(
+        Q(name__icontains=query) | Q(text__icontains=query)
+    )
@@ -1,13 +1,32 @@
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import transaction
 from drf_extra_fields.fields import Base64ImageField
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 
-from .models import Ingredient, Tag, Recipe, Follow, IngredientsAmount
+from .models import (CartIngredient, Ingredient, Tag, Recipe, Follow,
+                     IngredientsAmount, recipe_amounts)
 
 User = get_user_model()
 
+MAX_INTEGER = 2 ** 31 - 1
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Ссылки на уменьшенные копии картинки рецепта."""
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        variants = {}
+        for name, path in value.items():
+            url = default_storage.url(path)
+            variants[name] = (
+                request.build_absolute_uri(url) if request else url
+            )
+        return variants
+
 
 class FixedUserSerializer(UserSerializer):
     """Сериализатор для модели User."""
@@ -21,6 +40,8 @@ class FixedUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         if not user.is_anonymous:
             return Follow.objects.filter(user=user, author=obj.id).exists()
@@ -78,9 +99,13 @@ class IngredientsAmountSerializer(serializers.ModelSerializer):
     amount = serializers.IntegerField()
 
     def to_representation(self, instance):
-        data = IngredientSerializer(instance.ingredient).data
-        data["amount"] = instance.amount
-        return data
+        ingredient = instance.ingredient
+        return {
+            'id': ingredient.id,
+            'name': ingredient.name,
+            'measurement_unit': ingredient.measurement_unit,
+            'amount': instance.amount,
+        }
 
     class Meta:
         model = IngredientsAmount
@@ -102,21 +127,32 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time',
+            'is_in_shopping_cart', 'name', 'image', 'image_variants', 'text',
+            'cooking_time',
         )
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
         return Recipe.objects.filter(favorites__user=user, id=obj.id).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -159,6 +195,7 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags_data = validated_data.pop('tags')
         instance.tags.clear()
@@ -167,17 +204,58 @@ class RecipeSerializer(serializers.ModelSerializer):
         IngredientsAmount.objects.filter(recipe=instance).delete()
         ingredients = validated_data.pop('ingredientsamount_set')
         self.ingredients_create(ingredients, instance)
+        # bulk_create не отправляет post_save, новые количества
+        # добавляются в списки покупок здесь.
+        CartIngredient.objects.change_recipe(
+            instance.id, {}, recipe_amounts(instance.id)
+        )
 
         return super().update(instance, validated_data)
 
 
+class RecipeCoverageSerializer(RecipeSerializer):
+    """Сериализатор рецепта с покрытием ингредиентов пользователя."""
+    covered = serializers.IntegerField(
+        read_only=True,
+    )
+    missing = serializers.IntegerField(
+        read_only=True,
+    )
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('covered', 'missing')
+
+
+class CookQuerySerializer(serializers.Serializer):
+    """Параметры подбора рецептов по имеющимся ингредиентам."""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=MAX_INTEGER),
+        allow_empty=False,
+    )
+    max_missing = serializers.IntegerField(
+        min_value=0,
+        max_value=MAX_INTEGER,
+        required=False,
+    )
+
+
+class RecipesLimitSerializer(serializers.Serializer):
+    """Число рецептов в превью подписки."""
+    recipes_limit = serializers.IntegerField(
+        min_value=0,
+        max_value=MAX_INTEGER,
+        required=False,
+    )
+
+
 class ShoppingCartSerializer(serializers.ModelSerializer):
     """Сериализатор для ShoppingList."""
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
@@ -205,9 +283,7 @@ class FollowSerializer(serializers.ModelSerializer):
     )
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        read_only=True,
-    )
+    recipes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Follow
@@ -217,15 +293,20 @@ class FollowSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        return Follow.objects.filter(user=obj.user, author=obj.author).exists()
+        return True
 
     def get_recipes(self, obj):
+        if hasattr(obj.author, 'recipes_preview'):
+            return ShoppingCartSerializer(
+                obj.author.recipes_preview, many=True).data
         request = self.context.get('request')
         recipes_queryset = Recipe.objects.filter(author=obj.author)
-        recipes_limit = request.GET.get('recipes_limit')
-        if recipes_limit:
-            recipes_queryset = recipes_queryset[:int(recipes_limit)]
+        params = RecipesLimitSerializer(data=request.GET)
+        if params.is_valid() and 'recipes_limit' in params.validated_data:
+            recipes_queryset = recipes_queryset[
+                :params.validated_data['recipes_limit']]
         return ShoppingCartSerializer(recipes_queryset, many=True).data
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.author).count()
+        stats = getattr(obj.author, 'stats', None)
+        return stats.recipes_count if stats else 0
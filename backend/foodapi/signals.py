@@ -0,0 +1,173 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from .cache import ingredients_catalog, recipe_responses, tags_catalog
+from .models import (Cart, CartIngredient, Favorite, Follow, Ingredient,
+                     IngredientsAmount, Recipe, Tag, UserStats,
+                     change_counter)
+from .search import delete_recipe_search, update_recipe_search
+
+User = get_user_model()
+
+RECIPE_COUNTERS = {
+    Favorite: 'favorites_count',
+    Cart: 'carts_count',
+}
+
+
+def change_recipe_counter(model, recipe_id, delta):
+    change_counter(
+        Recipe.objects.filter(pk=recipe_id), RECIPE_COUNTERS[model], delta)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Cart)
+def recipe_marked(sender, instance, created, **kwargs):
+    if created:
+        change_recipe_counter(sender, instance.recipe_id, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Cart)
+def recipe_unmarked(sender, instance, **kwargs):
+    change_recipe_counter(sender, instance.recipe_id, -1)
+
+
+@receiver(pre_save, sender=Cart)
+@receiver(pre_save, sender=IngredientsAmount)
+def remember_previous(sender, instance, raw=False, **kwargs):
+    """Прежнее состояние строки, чтобы post_save учёл изменение."""
+    instance._previous = None
+    if instance.pk is not None and not raw:
+        instance._previous = sender.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=Cart)
+def cart_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = instance._previous
+    if previous is not None:
+        if (previous.user_id, previous.recipe_id) == (
+                instance.user_id, instance.recipe_id):
+            return
+        CartIngredient.objects.remove_recipe(
+            previous.user_id, previous.recipe_id)
+    CartIngredient.objects.add_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_delete, sender=Cart)
+def cart_deleted(sender, instance, **kwargs):
+    CartIngredient.objects.remove_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_save, sender=IngredientsAmount)
+def amount_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous, old_amounts = instance._previous, {}
+    if previous is not None:
+        if previous.recipe_id == instance.recipe_id:
+            old_amounts = {previous.ingredient_id: previous.amount}
+        else:
+            CartIngredient.objects.change_recipe(
+                previous.recipe_id,
+                {previous.ingredient_id: previous.amount}, {})
+    CartIngredient.objects.change_recipe(
+        instance.recipe_id, old_amounts,
+        {instance.ingredient_id: instance.amount})
+
+
+@receiver(post_delete, sender=IngredientsAmount)
+def amount_deleted(sender, instance, **kwargs):
+    CartIngredient.objects.change_recipe(
+        instance.recipe_id, {instance.ingredient_id: instance.amount}, {})
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.increment(instance.author_id, 'recipes_count')
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        update_recipe_search([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    UserStats.objects.increment(instance.author_id, 'recipes_count', -1)
+    delete_recipe_search([instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_response_changed(sender, instance, created, **kwargs):
+    dependencies = [f'recipe:{instance.pk}']
+    if created:
+        dependencies += ['recipes', f'author:{instance.author_id}']
+    recipe_responses.bump(*dependencies)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_response_deleted(sender, instance, **kwargs):
+    recipe_responses.bump(
+        'recipes', f'recipe:{instance.pk}', f'author:{instance.author_id}',
+        *(f'tag:{tag_id}' for tag_id in
+          instance.tags.values_list('pk', flat=True)),
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set,
+                        **kwargs):
+    if action == 'pre_clear':
+        related = instance.recipes if reverse else instance.tags
+        pk_set = set(related.values_list('pk', flat=True))
+    elif action not in ('post_add', 'post_remove'):
+        return
+    recipe_ids, tag_ids = [instance.pk], pk_set
+    if reverse:
+        recipe_ids, tag_ids = pk_set, [instance.pk]
+    recipe_responses.bump(
+        *(f'recipe:{recipe_id}' for recipe_id in recipe_ids),
+        *(f'tag:{tag_id}' for tag_id in tag_ids),
+    )
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        recipe_responses.bump(f'author:{instance.pk}')
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.increment(instance.author_id, 'followers_count')
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    UserStats.objects.increment(instance.author_id, 'followers_count', -1)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredients_changed(sender, **kwargs):
+    ingredients_catalog.invalidate()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tags_changed(sender, **kwargs):
+    tags_catalog.invalidate()
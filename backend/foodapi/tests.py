@@ -0,0 +1,325 @@
+import os
+import tempfile
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from . import search
+from .cache import ingredients_catalog, tags_catalog
+from .models import (Cart, CartIngredient, Favorite, Follow, Ingredient,
+                     IngredientsAmount, Recipe, Tag)
+from .pagination import LimitCursorPagination
+
+User = get_user_model()
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+
+@override_settings(CACHES=TEST_CACHES, RECIPE_CACHE_ENABLED=False)
+class RecipeApiTestCase(TestCase):
+    """Общие данные: автор, теги, ингредиенты и 70 рецептов."""
+    recipes_count = 70
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        cls.tags = Tag.objects.bulk_create([
+            Tag(name=f'Тег {slug}', color=f'#00000{number}', slug=slug)
+            for number, slug in enumerate(('a', 'b', 'c'))
+        ])
+        cls.ingredients = Ingredient.objects.bulk_create([
+            Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+            for number in range(3)
+        ])
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author,
+                name=f'Рецепт {number}',
+                image='images/recipe.png',
+                text='Описание',
+                cooking_time=number + 1,
+            )
+            for number in range(cls.recipes_count)
+        ]
+        IngredientsAmount.objects.bulk_create([
+            IngredientsAmount(recipe=recipe, ingredient=ingredient, amount=10)
+            for recipe in cls.recipes for ingredient in cls.ingredients[:2]
+        ])
+        for recipe in cls.recipes:
+            recipe.tags.set(cls.tags[:2])
+        for recipe in cls.recipes[::3]:
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+            Cart.objects.create(user=cls.user, recipe=recipe)
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        ingredients_catalog.invalidate()
+        tags_catalog.invalidate()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_ids(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+
+class RecipeQueryCountTest(RecipeApiTestCase):
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_recipe_list_queries_do_not_grow_with_page_size(self):
+        self.client.get('/api/recipes/?limit=1')
+        small = self.count_queries('/api/recipes/?limit=6')
+        with self.assertNumQueries(small):
+            response = self.client.get('/api/recipes/?limit=60')
+        self.assertEqual(len(response.data['results']), 60)
+
+
+class ShoppingListAggregateTest(RecipeApiTestCase):
+
+    def assertAggregateMatches(self):
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in
+            CartIngredient.objects.values_list(
+                'user_id', 'ingredient_id', 'amount')
+        }
+        self.assertEqual(stored, CartIngredient.objects.live_totals())
+
+    def test_aggregate_follows_cart_api(self):
+        recipe = self.recipes[1]
+        self.client.post(f'/api/recipes/{recipe.pk}/shopping_cart/')
+        self.assertAggregateMatches()
+        self.client.delete(f'/api/recipes/{recipe.pk}/shopping_cart/')
+        self.assertAggregateMatches()
+
+    def test_aggregate_follows_recipe_update(self):
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(
+            f'/api/recipes/{self.recipes[0].pk}/',
+            {
+                'tags': [self.tags[0].pk],
+                'ingredients': [
+                    {'id': self.ingredients[1].pk, 'amount': 3},
+                    {'id': self.ingredients[2].pk, 'amount': 7},
+                ],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertAggregateMatches()
+
+    def test_aggregate_follows_direct_changes(self):
+        amount = IngredientsAmount.objects.filter(
+            recipe=self.recipes[0]).first()
+        amount.amount = 25
+        amount.save()
+        IngredientsAmount.objects.create(
+            recipe=self.recipes[3], ingredient=self.ingredients[2], amount=5)
+        self.assertAggregateMatches()
+        cart = Cart.objects.filter(user=self.user).first()
+        cart.recipe = self.recipes[1]
+        cart.save()
+        self.assertAggregateMatches()
+        self.recipes[3].delete()
+        self.assertAggregateMatches()
+        self.author.delete()
+        self.assertAggregateMatches()
+        self.assertFalse(CartIngredient.objects.exists())
+
+
+class RecipeTagFilterTest(RecipeApiTestCase):
+
+    def test_recipe_with_several_matching_tags_appears_once(self):
+        self.recipes[0].tags.set(self.tags[1:])
+        for mode in ('any', 'all'):
+            with self.subTest(tags_mode=mode):
+                ids = self.get_ids(
+                    f'/api/recipes/?tags=a&tags=b&tags_mode={mode}'
+                    f'&limit=100'
+                )
+                self.assertEqual(len(ids), len(set(ids)))
+                expected = self.recipes_count - (mode == 'all')
+                self.assertEqual(len(ids), expected)
+                self.assertEqual(ids.count(self.recipes[1].pk), 1)
+
+
+class ExplainHotPathsTest(RecipeApiTestCase):
+
+    def test_hot_paths_do_not_scan_tables(self):
+        output = StringIO()
+        try:
+            call_command('explain_hot_paths', min_rows=0,
+                         user=self.user.username, skip_checks=False,
+                         stdout=output)
+        except CommandError as error:
+            self.fail(f'{error}\n{output.getvalue()}')
+
+
+class RecipeCursorPaginationTest(RecipeApiTestCase):
+
+    def walk(self, url, link):
+        ids, pages = [], []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([item['id'] for item in response.data['results']])
+            url = response.data[link]
+            self.assertLessEqual(len(pages), self.recipes_count)
+        for page in (pages if link == 'next' else reversed(pages)):
+            ids.extend(page)
+        return ids, response.data
+
+    def test_cursor_walks_orderings_with_equal_values(self):
+        Recipe.objects.update(pub_date=self.recipes[0].pub_date)
+        orderings = {
+            '-created': ('-pub_date', '-id'),
+            'created': ('pub_date', 'id'),
+            '-favorites': ('-favorites_count', '-id'),
+            'cooking_time': ('cooking_time', 'id'),
+        }
+        for param, ordering in orderings.items():
+            with self.subTest(ordering=param):
+                expected = list(Recipe.objects.order_by(
+                    *ordering).values_list('pk', flat=True))
+                ids, last = self.walk(
+                    f'/api/recipes/?ordering={param}&pagination=cursor'
+                    f'&limit=8', 'next')
+                self.assertEqual(ids, expected)
+                backward, _ = self.walk(last['previous'], 'previous')
+                self.assertEqual(backward, expected[:len(backward)])
+                self.assertEqual(
+                    len(backward) + len(last['results']), len(expected))
+
+    @skipUnless(connection.vendor == 'sqlite', 'план запроса SQLite')
+    def test_keyset_page_is_index_range(self):
+        pagination = LimitCursorPagination()
+        recipe = self.recipes[30]
+        for ordering, index, condition in (
+            (('-favorites_count', '-id'), 'recipe_favorites_id_idx',
+             'favorites_count<?'),
+            (('cooking_time', 'id'), 'recipe_cooking_time_id_idx',
+             'cooking_time>?'),
+            (('-pub_date', '-id'), 'recipe_pub_date_id_idx', 'pub_date<?'),
+        ):
+            with self.subTest(ordering=ordering):
+                position = pagination._get_position_from_instance(
+                    recipe, ordering)
+                plan = pagination.filter_after(
+                    Recipe.objects.order_by(*ordering), ordering, position
+                )[:9].explain()
+                self.assertIn(
+                    f'SEARCH foodapi_recipe USING INDEX {index} '
+                    f'({condition})', plan)
+
+
+class CatalogCacheTest(RecipeApiTestCase):
+
+    def test_catalog_version_changes_after_commit(self):
+        version = tags_catalog.version()
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Tag.objects.create(name='Новый', color='#111111', slug='new')
+        self.assertEqual(tags_catalog.version(), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(tags_catalog.version(), version)
+
+
+class RecipeSearchTest(RecipeApiTestCase):
+
+    def test_search_returns_every_match_best_first(self):
+        Recipe.objects.filter(pk=self.recipes[5].pk).update(
+            name='Рецепт рецепт рецепт')
+        search.update_recipe_search([self.recipes[5].pk])
+        response = self.client.get('/api/recipes/?search=рецепт&limit=100')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], self.recipes_count)
+        self.assertEqual(
+            response.data['results'][0]['id'], self.recipes[5].pk)
+
+
+class RecipeCookTest(RecipeApiTestCase):
+
+    def test_cook_counts_covered_and_missing_ingredients(self):
+        IngredientsAmount.objects.create(
+            recipe=self.recipes[0], ingredient=self.ingredients[2], amount=1)
+        response = self.client.get(
+            f'/api/recipes/cook/?ingredients={self.ingredients[2].pk}'
+            f'&limit=100')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+        recipe = response.data['results'][0]
+        self.assertEqual(recipe['id'], self.recipes[0].pk)
+        self.assertEqual((recipe['covered'], recipe['missing']), (1, 2))
+        response = self.client.get(
+            f'/api/recipes/cook/?ingredients={self.ingredients[0].pk},'
+            f'{self.ingredients[1].pk}&max_missing=0&limit=100')
+        self.assertEqual(response.data['count'], self.recipes_count - 1)
+
+    def test_invalid_numbers_are_rejected(self):
+        for url in (
+            '/api/recipes/cook/?ingredients=99999999999999999999999',
+            '/api/recipes/cook/?ingredients=²',
+            '/api/recipes/cook/?ingredients=',
+            '/api/recipes/cook/?ingredients=1&max_missing=²',
+            '/api/recipes/cook/?ingredients=1'
+            '&max_missing=99999999999999999999999',
+            '/api/users/subscriptions/?recipes_limit=²',
+            '/api/users/subscriptions/?recipes_limit=99999999999999999999999',
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('errors', response.data)
+
+
+class LoadDataTest(TestCase):
+
+    def test_malformed_csv_rows_are_skipped(self):
+        with tempfile.NamedTemporaryFile(
+                'w', suffix='.csv', encoding='utf-8', delete=False) as file:
+            file.write('соль,г\nбез единицы\n,шт\n\nсахар,г,лишнее\n')
+        self.addCleanup(os.remove, file.name)
+        output = StringIO()
+        call_command('load_data', file.name, stdout=output)
+        self.assertEqual(
+            set(Ingredient.objects.values_list('name', flat=True)),
+            {'соль', 'сахар'},
+        )
+        self.assertIn('пропущено строк: 2', output.getvalue())
+
+
+@override_settings(RECIPE_CACHE_ENABLED=True)
+class RecipeResponseCacheTest(RecipeApiTestCase):
+
+    def test_ordered_page_follows_favorites(self):
+        url = '/api/recipes/?ordering=-favorites&limit=5'
+        self.assertNotEqual(self.get_ids(url)[0], self.recipes[1].pk)
+        other = APIClient()
+        other.force_authenticate(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            for client in (self.client, other):
+                response = client.post(
+                    f'/api/recipes/{self.recipes[1].pk}/favorite/')
+                self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.get_ids(url)[0], self.recipes[1].pk)
@@ -1,7 +1,7 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import (IngredientsViewSet, RecipeViewSet,
+from .views import (IngredientsViewSet, MetricsView, RecipeViewSet,
                     TagsViewSet, FixedUserViewSet)
 
 app_name = 'api'
@@ -14,6 +14,7 @@ router.register('recipes', RecipeViewSet)
 router.register('users', FixedUserViewSet)
 
 urlpatterns = [
+    path('metrics', MetricsView.as_view(), name='metrics'),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
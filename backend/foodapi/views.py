@@ -2,19 +2,32 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.parsers import FileUploadParser, MultiPartParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import APIView
 from djoser.views import UserViewSet
-from django.db.models import Sum
+from django.db import transaction
+from django.db.models import (Exists, OuterRef, Prefetch,
+                              prefetch_related_objects)
 from django.contrib.auth import get_user_model
-from django.http.response import HttpResponse
+from django.http.response import HttpResponse, StreamingHttpResponse
 
-from .models import (Ingredient, Tag, Recipe, Cart,
-                     Favorite, Follow, IngredientsAmount)
+from .async_views import AsyncViewSetMixin
+from .cache import (CatalogCacheMixin, RecipeCacheMixin, ingredients_catalog,
+                    tags_catalog)
+from .images import (LimitedUploadHandler, schedule_variants,
+                     store_uploaded_image)
+from .metrics import CONTENT_TYPE, metrics, render_metrics
+from .exporters import EXPORT_FORMATS, batched, shopping_list_rows
+from .models import Ingredient, Tag, Recipe, Cart, Favorite, Follow
 from .permissions import IsAdminOrReadOnly, IsOwnerOrReadOnly
 from .serializers import (TagSerializer, IngredientSerializer,
                           RecipeSerializer, FollowSerializer,
-                          ShoppingCartSerializer)
+                          RecipeCoverageSerializer, ShoppingCartSerializer,
+                          CookQuerySerializer, RecipesLimitSerializer)
 from .pagination import LimitPageNumberPagination
+from .renderers import CSVRenderer, PlainTextRenderer
 from .filters import IngredientFilter, RecipeFilter
 
 User = get_user_model()
@@ -22,6 +35,16 @@ User = get_user_model()
 
 class FixedUserViewSet(UserViewSet):
     pagination_class = LimitPageNumberPagination
+    replica_actions = ('list', 'retrieve', 'subscriptions')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset
+        return queryset.annotate(is_subscribed=Exists(
+            Follow.objects.filter(user=user, author=OuterRef('pk'))
+        ))
 
     @action(detail=True, methods=['delete', 'post'],
             permission_classes=[IsAuthenticated])
@@ -73,9 +96,26 @@ class FixedUserViewSet(UserViewSet):
     @action(detail=False, methods=['get'],
             permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
+        params = RecipesLimitSerializer(data=request.query_params)
+        if not params.is_valid():
+            return Response(
+                {'errors': params.errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         user = request.user
-        queryset = Follow.objects.filter(user=user)
+        queryset = Follow.objects.filter(user=user).select_related(
+            'author', 'author__stats'
+        )
         pages = self.paginate_queryset(queryset)
+        recipes = Recipe.objects.filter(
+            author__in=[follow.author_id for follow in pages]
+        )
+        if 'recipes_limit' in params.validated_data:
+            recipes = recipes.limited_per_author(
+                params.validated_data['recipes_limit'])
+        prefetch_related_objects(pages, Prefetch(
+            'author__recipes', queryset=recipes, to_attr='recipes_preview'
+        ))
         serializer = FollowSerializer(
             pages,
             many=True,
@@ -84,29 +124,66 @@ class FixedUserViewSet(UserViewSet):
         return self.get_paginated_response(serializer.data)
 
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+class TagsViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     permission_classes = (IsAdminOrReadOnly,)
+    replica_actions = ('list', 'retrieve')
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    catalog = tags_catalog
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientsViewSet(AsyncViewSetMixin, CatalogCacheMixin,
+                         viewsets.ReadOnlyModelViewSet):
     permission_classes = (IsAdminOrReadOnly,)
+    async_actions = ('list', 'retrieve')
+    replica_actions = ('list', 'retrieve')
+    catalog = ingredients_catalog
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filterset_class = IngredientFilter
-    search_fields = ('^name',)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AsyncViewSetMixin, RecipeCacheMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
+    async_actions = ('list', 'retrieve')
+    replica_actions = ('list', 'retrieve', 'cook', 'download_shopping_cart')
     serializer_class = RecipeSerializer
     permission_classes = (IsOwnerOrReadOnly,)
     pagination_class = LimitPageNumberPagination
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        return super().get_queryset().with_related().with_user_flags(
+            self.request.user
+        )
+
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        recipe = serializer.save(author=self.request.user)
+        schedule_variants(recipe.pk)
+        serializer.instance = self.get_queryset().get(pk=recipe.pk)
+
+    def perform_update(self, serializer):
+        recipe = serializer.save()
+        if 'image' in serializer.validated_data:
+            schedule_variants(recipe.pk)
+        serializer.instance = self.get_queryset().get(pk=recipe.pk)
+
+    @action(detail=True, methods=['put'],
+            permission_classes=[IsAuthenticated, IsOwnerOrReadOnly],
+            parser_classes=[MultiPartParser, FileUploadParser])
+    def image(self, request, pk):
+        request.upload_handlers = [LimitedUploadHandler(request)]
+        recipe = self.get_object()
+        upload = request.data.get('image') or request.data.get('file')
+        if upload is None:
+            return Response(
+                {'errors': 'Передайте файл картинки в поле image!'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        store_uploaded_image(recipe, upload)
+        serializer = self.get_serializer(self.get_queryset().get(pk=pk))
+        return Response(serializer.data)
 
     @action(detail=True, methods=['delete', 'post'],
             permission_classes=[IsAuthenticated])
@@ -127,26 +204,52 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return None
 
     @action(detail=False, methods=['get'],
-            permission_classes=[IsAuthenticated])
+            permission_classes=[IsAuthenticated],
+            renderer_classes=[PlainTextRenderer, CSVRenderer, JSONRenderer])
     def download_shopping_cart(self, request):
         user = self.request.user
         if not user.carts.exists():
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        ingredients = IngredientsAmount.objects.filter(
-            recipe__carts__user=request.user).values_list(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(ingr_sum=Sum('amount'))
-        filename = f'{user.username}_shopping_list.txt'
-        text = f'Список покупок пользователя {user.username}:\n'
-        for ingr in ingredients:
-            text += f'{ingr[0]} {ingr[1]} - {ingr[2]}\n'
-        response = HttpResponse(
-            text, content_type='text.txt; charset=utf-8'
+        export_format = request.accepted_renderer.format
+        content_type, exporter = EXPORT_FORMATS[export_format]
+        rows = shopping_list_rows(user)
+        response = StreamingHttpResponse(
+            batched(exporter(user, rows)), content_type=content_type
         )
+        filename = f'{user.username}_shopping_list.{export_format}'
         response['Content-Disposition'] = f'attachment; filename={filename}'
         return response
 
+    @action(detail=False, methods=['get'])
+    def cook(self, request):
+        data = {'ingredients': [
+            value for param in request.query_params.getlist('ingredients')
+            for value in param.split(',') if value
+        ]}
+        if request.query_params.get('max_missing'):
+            data['max_missing'] = request.query_params['max_missing']
+        params = CookQuerySerializer(data=data)
+        if not params.is_valid():
+            return Response(
+                {'errors': params.errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        queryset = self.filter_queryset(
+            self.get_queryset()
+        ).covering_ingredients(set(params.validated_data['ingredients']))
+        if 'max_missing' in params.validated_data:
+            queryset = queryset.filter(
+                missing__lte=params.validated_data['max_missing'])
+        pages = self.paginate_queryset(queryset)
+        serializer = RecipeCoverageSerializer(
+            pages,
+            many=True,
+            context={'request': request},
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @transaction.atomic
     def delete_db_record(self, user, model, pk):
         record = model.objects.filter(user=user, recipe__id=pk)
         if record.exists():
@@ -157,6 +260,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST,
         )
 
+    @transaction.atomic
     def add_db_record(self, user, model, pk):
         record = model.objects.filter(user=user, recipe__id=pk)
         if record.exists():
@@ -168,3 +272,14 @@ class RecipeViewSet(viewsets.ModelViewSet):
         model.objects.create(user=user, recipe=recipe)
         serializer = ShoppingCartSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class MetricsView(APIView):
+    """Метрики всех процессов в текстовом формате Prometheus."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(
+            render_metrics(*metrics.collect()),
+            content_type=CONTENT_TYPE,
+        )
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -31,6 +32,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodapi.middleware.ReplicaRoutingMiddleware',
+    'foodapi.middleware.MetricsMiddleware',
+    'foodapi.middleware.QueryProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,6 +63,9 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
+ASGI_APPLICATION = 'foodgram.asgi.application'
+
+ASYNC_VIEWS = os.getenv('SERVER_MODE', default='wsgi') == 'asgi'
 
 DATABASES = {
     'default': {
@@ -85,10 +92,137 @@ DATABASES = {
         'PORT': os.getenv(
             'DB_PORT',
             default='5432'
-        )
+        ),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=0)),
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv(
+            'DB_PGBOUNCER',
+            default='False'
+        ) == 'True',
     }
 }
 
+DATABASE_REPLICAS = []
+for number, replica in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', default='').split(','))):
+    alias = f'replica{number}'
+    DATABASES[alias] = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    if DATABASES[alias]['ENGINE'] == 'django.db.backends.sqlite3':
+        DATABASES[alias]['NAME'] = replica.strip()
+    else:
+        DATABASES[alias]['HOST'] = replica.strip()
+    DATABASE_REPLICAS.append(alias)
+
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['foodapi.routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', default=10))
+
+DB_HEALTH_CHECK_INTERVAL = float(
+    os.getenv('DB_HEALTH_CHECK_INTERVAL', default=30)
+)
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            default=os.path.join(tempfile.gettempdir(), 'foodgram_cache')
+        ),
+    }
+}
+
+CATALOG_CACHE_SIZE = int(os.getenv('CATALOG_CACHE_SIZE', default=256))
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', default=86400))
+RECIPE_CACHE_ENABLED = os.getenv(
+    'RECIPE_CACHE_ENABLED',
+    default='True'
+) == 'True'
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', default=300))
+
+INGREDIENT_SEARCH_BACKEND = os.getenv(
+    'INGREDIENT_SEARCH_BACKEND',
+    default='memory'
+)
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', default=20))
+
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    INSTALLED_APPS.append('django.contrib.postgres')
+
+PAGINATION_APPROXIMATE_COUNT = os.getenv(
+    'PAGINATION_APPROXIMATE_COUNT',
+    default='False'
+) == 'True'
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', default=30)
+)
+PAGINATION_ESTIMATE_THRESHOLD = int(
+    os.getenv('PAGINATION_ESTIMATE_THRESHOLD', default=100000)
+)
+
+QUERY_PROFILING = os.getenv('QUERY_PROFILING', default='False') == 'True'
+QUERY_PROFILING_SAMPLE_RATE = float(
+    os.getenv('QUERY_PROFILING_SAMPLE_RATE', default=0.01)
+)
+QUERY_PROFILING_MAX_QUERIES = int(
+    os.getenv('QUERY_PROFILING_MAX_QUERIES', default=20)
+)
+QUERY_PROFILING_MAX_DB_TIME = float(
+    os.getenv('QUERY_PROFILING_MAX_DB_TIME', default=200)
+)
+QUERY_PROFILING_MAX_DUPLICATES = int(
+    os.getenv('QUERY_PROFILING_MAX_DUPLICATES', default=5)
+)
+QUERY_PROFILING_LOG_FILE = os.getenv('QUERY_PROFILING_LOG_FILE')
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', default='True') == 'True'
+METRICS_DIR = os.getenv(
+    'METRICS_DIR',
+    default=os.path.join(tempfile.gettempdir(), 'foodgram_metrics')
+)
+METRICS_FLUSH_INTERVAL = float(
+    os.getenv('METRICS_FLUSH_INTERVAL', default=5)
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {
+            'format': '%(asctime)s %(levelname)s %(name)s %(message)s',
+        },
+        'message': {
+            'format': '%(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'plain',
+        },
+    },
+    'loggers': {
+        'foodapi.queries': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+if QUERY_PROFILING_LOG_FILE:
+    LOGGING['handlers']['query_log'] = {
+        'class': 'logging.handlers.WatchedFileHandler',
+        'filename': QUERY_PROFILING_LOG_FILE,
+        'formatter': 'message',
+    }
+    LOGGING['loggers']['foodapi.queries.sample'] = {
+        'handlers': ['query_log'],
+        'level': 'INFO',
+        'propagate': False,
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.'
@@ -126,6 +260,22 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+RECIPE_IMAGE_VARIANTS = {
+    'small': 320,
+    'medium': 960,
+}
+IMAGE_VARIANT_QUALITY = 80
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', default=10 * 2 ** 20)
+)
+RECIPE_IMAGE_MAX_DIMENSION = int(
+    os.getenv('RECIPE_IMAGE_MAX_DIMENSION', default=6000)
+)
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
+IMAGE_PROCESSING_SYNC = os.getenv(
+    'IMAGE_PROCESSING_SYNC',
+    default='False'
+) == 'True'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -0,0 +1,29 @@
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+bind = os.getenv('GUNICORN_BIND', default='0.0.0.0:8000')
+
+if os.getenv('SERVER_MODE', default='wsgi') == 'asgi':
+    wsgi_app = 'foodgram.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram.wsgi:application'
+
+
+def on_starting(server):
+    from foodapi.metrics import metrics
+
+    metrics.clear()
+
+
+def worker_exit(server, worker):
+    from foodapi.metrics import metrics
+
+    metrics.flush(force=True)
+
+
+def child_exit(server, worker):
+    from foodapi.metrics import metrics
+
+    metrics.archive_process(worker.pid)